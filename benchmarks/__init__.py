@@ -0,0 +1,16 @@
+import os
+
+
+def setup(**environ):
+    """Configure Django for a standalone benchmark process.
+
+    ``environ`` overrides settings environment variables such as DB_ENGINE
+    and DB_NAME; everything else comes from the caller's environment.
+    """
+    os.environ.update(environ)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library.settings")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    import django
+
+    django.setup()
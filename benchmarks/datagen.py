@@ -0,0 +1,246 @@
+"""Fill an empty database with a deterministic synthetic dataset.
+
+Rows go in through batched executemany() calls instead of the ORM, so a
+full-size run finishes in minutes:
+
+    DB_NAME=bench.sqlite3 python -m benchmarks.datagen \\
+        --books 1000000 --users 100000 --borrowings 10000000
+
+The same seed and sizes always produce the same rows. Every generated user
+has the password ``benchmark``; ``user0@bench.example`` is a reader and
+``admin@bench.example`` is staff.
+"""
+import argparse
+import array
+import datetime
+import json
+import random
+import sys
+import time
+from decimal import Decimal
+
+import benchmarks
+
+PASSWORD = "benchmark"
+ADMIN_EMAIL = "admin@bench.example"
+USER_EMAIL = "user{}@bench.example"
+HISTORY_DAYS = 730
+
+WORDS = (
+    "ancient", "autumn", "blue", "broken", "city", "dark", "dawn", "desert",
+    "dream", "empire", "garden", "ghost", "glass", "golden", "harbor",
+    "hidden", "house", "iron", "island", "kingdom", "last", "light", "lost",
+    "memory", "midnight", "mountain", "night", "ocean", "promise", "quiet",
+    "river", "road", "secret", "shadow", "silent", "silver", "song", "star",
+    "storm", "stranger", "summer", "tide", "tower", "wild", "winter", "wolf",
+)
+FIRST_NAMES = (
+    "Ada", "Alan", "Anna", "Boris", "Clara", "Daniel", "Elena", "Frank",
+    "Grace", "Hugo", "Irina", "Jonas", "Kate", "Leo", "Maria", "Nina",
+    "Oleg", "Paula", "Roman", "Sofia", "Taras", "Vera", "Yuri", "Zoe",
+)
+LAST_NAMES = (
+    "Adams", "Bondar", "Carter", "Dubois", "Evans", "Fischer", "Garcia",
+    "Hughes", "Ivanenko", "Jensen", "Kovalenko", "Larsen", "Moreau",
+    "Novak", "Olsen", "Petrenko", "Quinn", "Rossi", "Shevchenko", "Tkachuk",
+)
+
+
+def insert(model, fields, rows, batch_size):
+    """executemany() ``rows`` into ``model``'s table, one transaction per batch."""
+    from django.db import connection
+
+    opts = model._meta
+    columns = ", ".join(
+        connection.ops.quote_name(opts.get_field(name).column) for name in fields
+    )
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        connection.ops.quote_name(opts.db_table),
+        columns,
+        ", ".join(["%s"] * len(fields)),
+    )
+
+    batch = []
+    inserted = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            inserted += _flush(sql, batch)
+            batch = []
+    if batch:
+        inserted += _flush(sql, batch)
+    return inserted
+
+
+def _flush(sql, batch):
+    from django.db import connection, transaction
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, batch)
+    return len(batch)
+
+
+def first_id(model):
+    return model.objects.order_by("id").values_list("id", flat=True).first()
+
+
+def generate(books, users, borrowings, payments, seed, batch_size, log):
+    from django.contrib.auth.hashers import make_password
+    from django.db import connection
+    from django.utils import timezone
+
+    from books.models import Book
+    from borrowings.models import Borrowing
+    from library.cache import invalidate
+    from payment.models import Payment
+    from users.models import User
+
+    rng = random.Random(seed)
+    ops = connection.ops
+    today = datetime.date(2024, 1, 1)
+    dates = [
+        ops.adapt_datefield_value(today - datetime.timedelta(days=offset))
+        for offset in range(HISTORY_DAYS + 60, -60, -1)
+    ]
+    day_zero = HISTORY_DAYS + 60
+    joined = ops.adapt_datetimefield_value(timezone.now())
+    fees = [
+        ops.adapt_decimalfield_value(Decimal(cents) / 100, 4, 2)
+        for cents in range(10, 1000, 5)
+    ]
+    password = make_password(PASSWORD)
+    summary = {"seed": seed}
+
+    started = time.perf_counter()
+    summary["users"] = insert(
+        User,
+        (
+            "email", "password", "is_superuser", "is_staff", "is_active",
+            "first_name", "last_name", "date_joined",
+        ),
+        [(ADMIN_EMAIL, password, True, True, True, "", "", joined)]
+        + [
+            (
+                USER_EMAIL.format(index), password, False, False, True,
+                rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), joined,
+            )
+            for index in range(users)
+        ],
+        batch_size,
+    )
+    log(f"users: {summary['users']} in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    summary["books"] = insert(
+        Book,
+        ("title", "author", "cover", "inventory", "daily_fee"),
+        (
+            (
+                " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title(),
+                f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                rng.choice(Book.Cover.values),
+                rng.randint(1, 100),
+                rng.choice(fees),
+            )
+            for _ in range(books)
+        ),
+        batch_size,
+    )
+    log(f"books: {summary['books']} in {time.perf_counter() - started:.1f}s")
+
+    user_zero = first_id(User) + 1
+    book_zero = first_id(Book)
+    borrowers = array.array("q")
+
+    def borrowing_rows():
+        for _ in range(borrowings):
+            user_id = user_zero + rng.randrange(users)
+            borrowers.append(user_id)
+            borrowed = day_zero - rng.randrange(HISTORY_DAYS)
+            returned = None
+            if rng.random() < 0.9:
+                returned = dates[min(borrowed + rng.randint(0, 40), day_zero)]
+            yield (
+                dates[borrowed],
+                dates[borrowed + rng.randint(3, 30)],
+                returned,
+                book_zero + rng.randrange(books),
+                user_id,
+            )
+
+    started = time.perf_counter()
+    summary["borrowings"] = insert(
+        Borrowing,
+        ("borrow_date", "expected_return_date", "actual_return_date", "book", "user"),
+        borrowing_rows(),
+        batch_size,
+    )
+    log(
+        f"borrowings: {summary['borrowings']} "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+    borrowing_zero = first_id(Borrowing)
+    started = time.perf_counter()
+    summary["payments"] = insert(
+        Payment,
+        ("status", "type", "borrowing", "user", "money_to_pay"),
+        (
+            (
+                rng.choice(Payment.Status.values),
+                Payment.Type.FINE,
+                borrowing_zero + index,
+                borrowers[index],
+                rng.choice(fees),
+            )
+            for index in sorted(
+                rng.sample(range(borrowings), min(payments, borrowings))
+            )
+        ),
+        batch_size,
+    )
+    log(f"payments: {summary['payments']} in {time.perf_counter() - started:.1f}s")
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    for name in ("books", "borrowings"):
+        invalidate(name)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--borrowings", type=int, default=1_000_000)
+    parser.add_argument("--payments", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    benchmarks.setup()
+    from django.core.management import call_command
+
+    from books.models import Book
+    from users.models import User
+
+    call_command("migrate", verbosity=0)
+    if User.objects.exists() or Book.objects.exists():
+        parser.error("the database is not empty; point DB_NAME at a new file")
+
+    started = time.perf_counter()
+    summary = generate(
+        books=args.books,
+        users=args.users,
+        borrowings=args.borrowings,
+        payments=args.payments,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        log=lambda message: print(message, file=sys.stderr),
+    )
+    summary["seconds"] = round(time.perf_counter() - started, 1)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""Drive every API endpoint and report latency, throughput and query counts.
+
+Run it against a database filled by ``benchmarks.datagen``. By default the
+requests go through Django's test client in this process, which also
+counts SQL queries. ``--url`` sends them over HTTP to a running server on
+the same database instead:
+
+    DB_NAME=bench.sqlite3 python -m benchmarks.load --requests 200 \\
+        --output before.json
+    DB_NAME=bench.sqlite3 python -m benchmarks.load --requests 200 \\
+        --baseline before.json
+
+Endpoints run one after another, each with ``--warmup`` untimed requests
+first. Request parameters come from a seeded RNG, so two runs on the same
+dataset issue the same requests. Write endpoints change the data;
+regenerate the dataset when runs have to be compared exactly.
+Throttling is off unless THROTTLING=True; start the server for ``--url``
+with THROTTLING=False as well.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import ExitStack
+
+import benchmarks
+from benchmarks.datagen import ADMIN_EMAIL, PASSWORD, USER_EMAIL, WORDS
+
+BOUNDARY = "BenchmarkBoundary"
+MULTIPART = f"multipart/form-data; boundary={BOUNDARY}"
+IMPORT_CSV = "title,author,cover,inventory,daily_fee\n" + "".join(
+    f"Imported {index},Bench,HR,5,1.50\n" for index in range(20)
+)
+
+
+class Endpoint:
+    """One timed request shape.
+
+    ``path`` and ``data`` are values or callables taking the run state;
+    ``collect`` receives the state and the decoded response body.
+    """
+
+    def __init__(
+        self, name, method, path, role="user", data=None, multipart=False,
+        collect=None,
+    ):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.role = role
+        self.data = data
+        self.multipart = multipart
+        self.collect = collect
+
+    def build(self, state):
+        path = self.path(state) if callable(self.path) else self.path
+        data = self.data(state) if callable(self.data) else self.data
+        if data is None:
+            return path, b"", None
+        if self.multipart:
+            from django.test.client import encode_multipart
+
+            return path, encode_multipart(BOUNDARY, data), MULTIPART
+        return path, json.dumps(data).encode(), "application/json"
+
+
+class State:
+    def __init__(self, seed):
+        from books.models import Book
+        from borrowings.models import Borrowing
+        from payment.models import Payment
+        from users.models import User
+
+        self.rng = random.Random(seed)
+        self.user = User.objects.get(email=USER_EMAIL.format(0))
+        self.book_ids = range(
+            Book.objects.order_by("id").values_list("id", flat=True).first(),
+            Book.objects.order_by("-id").values_list("id", flat=True).first() + 1,
+        )
+        self.borrowing_ids = list(
+            Borrowing.objects.filter(user=self.user).values_list("id", flat=True)
+        )
+        self.active_borrowings = list(
+            Borrowing.objects.filter(
+                user=self.user, actual_return_date__isnull=True
+            ).values_list("id", flat=True)
+        )
+        self.payment_ids = list(Payment.objects.values_list("id", flat=True)[:1000])
+        self.created_books = []
+        self.created_payments = []
+        self.created_users = 0
+        self.tokens = {}
+        self.due = (datetime.date.today() + datetime.timedelta(days=14)).isoformat()
+
+    def book(self):
+        return self.rng.choice(self.book_ids)
+
+    def search(self):
+        return " ".join(self.rng.sample(WORDS, 2))
+
+
+def _keep(pool):
+    def collect(state, body):
+        getattr(state, pool).append(body["id"])
+
+    return collect
+
+
+def _keep_borrowings(state, body):
+    for item in body:
+        if item["success"]:
+            state.active_borrowings.append(item["borrowing"]["id"])
+
+
+def _register(state):
+    state.created_users += 1
+    return {
+        "email": f"load{state.created_users}-{time.time_ns()}@bench.example",
+        "password": PASSWORD,
+    }
+
+
+ENDPOINTS = [
+    Endpoint("admin-login", "GET", "/admin/login/", role=None),
+    Endpoint("schema", "GET", "/api/schema/", role=None),
+    Endpoint("swagger", "GET", "/api/doc/swagger/", role=None),
+    Endpoint("redoc", "GET", "/api/doc/redoc/", role=None),
+    Endpoint("user-register", "POST", "/api/user/register/", role=None,
+             data=_register),
+    Endpoint("token-obtain", "POST", "/api/user/token/", role=None,
+             data={"email": USER_EMAIL.format(0), "password": PASSWORD}),
+    Endpoint("token-refresh", "POST", "/api/user/token/refresh/", role=None,
+             data=lambda state: {"refresh": state.tokens["refresh"]}),
+    Endpoint("token-verify", "POST", "/api/user/token/verify/", role=None,
+             data=lambda state: {"token": state.tokens["user"]}),
+    Endpoint("books-list", "GET", "/api/books/"),
+    Endpoint("books-list-large-page", "GET", "/api/books/?page_size=500"),
+    Endpoint("books-search", "GET",
+             lambda state: f"/api/books/?search="
+                           f"{urllib.parse.quote(state.search())}"),
+    Endpoint("books-detail", "GET", lambda state: f"/api/books/{state.book()}/"),
+    Endpoint("books-create", "POST", "/api/books/", role="admin",
+             data={"title": "Load", "author": "Bench", "cover": "HR",
+                   "inventory": 10, "daily_fee": "1.00"},
+             collect=_keep("created_books")),
+    Endpoint("books-update", "PATCH",
+             lambda state: f"/api/books/{state.book()}/", role="admin",
+             data={"inventory": 100}),
+    Endpoint("books-delete", "DELETE",
+             lambda state: f"/api/books/{state.created_books.pop()}/",
+             role="admin"),
+    Endpoint("books-import", "POST", "/api/books/import/", role="admin",
+             data=lambda state: {"file": _upload()}, multipart=True),
+    Endpoint("borrowings-list", "GET", "/api/borrowings/"),
+    Endpoint("borrowings-list-admin", "GET",
+             "/api/borrowings/?is_active=true", role="admin"),
+    Endpoint("borrowings-detail", "GET",
+             lambda state: f"/api/borrowings/"
+                           f"{state.rng.choice(state.borrowing_ids)}/"),
+    Endpoint("borrowings-create", "POST", "/api/borrowings/create/",
+             data=lambda state: {"book": state.book(), "user": state.user.pk,
+                                 "expected_return_date": state.due}),
+    Endpoint("borrowings-bulk-create", "POST", "/api/borrowings/bulk-create/",
+             data=lambda state: {"user": state.user.pk,
+                                 "books": [state.book(), state.book()],
+                                 "expected_return_date": state.due},
+             collect=_keep_borrowings),
+    Endpoint("borrowings-return", "POST",
+             lambda state: f"/api/borrowings/"
+                           f"{state.active_borrowings.pop()}/return/"),
+    Endpoint("borrowings-delete", "DELETE",
+             lambda state: f"/api/borrowings/{state.active_borrowings.pop()}/",
+             role="admin"),
+    Endpoint("borrowings-export", "GET",
+             lambda state: f"/api/borrowings/export/?user_id={state.user.pk}",
+             role="admin"),
+    Endpoint("payments-list", "GET", "/api/payments/"),
+    Endpoint("payments-detail", "GET",
+             lambda state: f"/api/payments/"
+                           f"{state.rng.choice(state.payment_ids)}/"),
+    Endpoint("payments-create", "POST", "/api/payments/", role="admin",
+             data={"status": "PN", "type": "PN", "money_to_pay": "5.00"},
+             collect=_keep("created_payments")),
+    Endpoint("payments-update", "PATCH",
+             lambda state: f"/api/payments/{state.created_payments[-1]}/",
+             role="admin", data={"status": "PD"}),
+    Endpoint("payments-delete", "DELETE",
+             lambda state: f"/api/payments/{state.created_payments.pop()}/",
+             role="admin"),
+]
+
+
+def _upload():
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    return SimpleUploadedFile("books.csv", IMPORT_CSV.encode(), "text/csv")
+
+
+class ClientTransport:
+    """In-process requests through the test client, with query counting."""
+
+    name = "client"
+
+    def __init__(self):
+        from django.conf import settings
+        from django.test import Client
+
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+        self.client = Client(raise_request_exception=False)
+
+    def request(self, method, path, body, content_type, headers):
+        from django.db import connections
+        from django.test.utils import CaptureQueriesContext
+
+        extra = {f"HTTP_{name.upper()}": value for name, value in headers.items()}
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connection))
+                for connection in connections.all()
+            ]
+            response = self.client.generic(
+                method, path, body, content_type=content_type, **extra
+            )
+            if response.streaming:
+                content = b"".join(response.streaming_content)
+            else:
+                content = response.content
+            response.close()
+        return response.status_code, content, sum(map(len, captured))
+
+
+class HTTPTransport:
+    """Requests over HTTP to a running server; queries are not counted."""
+
+    name = "http"
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def request(self, method, path, body, content_type, headers):
+        request = urllib.request.Request(
+            self.url + path, data=body or None, method=method, headers=headers
+        )
+        if content_type:
+            request.add_header("Content-Type", content_type)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read(), None
+        except urllib.error.HTTPError as error:
+            return error.code, error.read(), None
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return None
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))]
+
+
+def authenticate(transport, state):
+    for role, email in (("user", USER_EMAIL.format(0)), ("admin", ADMIN_EMAIL)):
+        status, content, _ = transport.request(
+            "POST",
+            "/api/user/token/",
+            json.dumps({"email": email, "password": PASSWORD}).encode(),
+            "application/json",
+            {},
+        )
+        if status != 200:
+            sys.exit(f"Could not obtain a token for {email}: {status}")
+        tokens = json.loads(content)
+        state.tokens[role] = tokens["access"]
+        state.tokens.setdefault("refresh", tokens["refresh"])
+
+
+def call(transport, state, endpoint):
+    path, body, content_type = endpoint.build(state)
+    headers = {}
+    if endpoint.role:
+        headers["Authorization"] = f"Bearer {state.tokens[endpoint.role]}"
+
+    started = time.perf_counter()
+    status, content, queries = transport.request(
+        endpoint.method, path, body, content_type, headers
+    )
+    elapsed = time.perf_counter() - started
+
+    if endpoint.collect and status < 300:
+        endpoint.collect(state, json.loads(content))
+    return status, elapsed, queries
+
+
+def measure(transport, state, endpoint, requests, warmup):
+    for _ in range(warmup):
+        call(transport, state, endpoint)
+
+    latencies = []
+    queries = []
+    statuses = {}
+    for _ in range(requests):
+        status, elapsed, count = call(transport, state, endpoint)
+        latencies.append(elapsed * 1000)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if count is not None:
+            queries.append(count)
+
+    latencies.sort()
+    return {
+        "method": endpoint.method,
+        "requests": requests,
+        "errors": sum(
+            count for status, count in statuses.items() if int(status) >= 400
+        ),
+        "statuses": statuses,
+        "throughput_rps": round(requests / (sum(latencies) / 1000), 1),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(latencies[-1], 3),
+        },
+        "queries": {
+            "mean": round(sum(queries) / len(queries), 2),
+            "max": max(queries),
+        } if queries else None,
+    }
+
+
+def describe_run(transport, args):
+    import django
+    from django.db import connection
+
+    from books.models import Book
+    from borrowings.models import Borrowing
+    from payment.models import Payment
+    from users.models import User
+
+    def git(*command):
+        try:
+            return subprocess.run(
+                ["git", *command], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": {
+            "vendor": connection.vendor,
+            "engine": connection.settings_dict["ENGINE"],
+        },
+        "dataset": {
+            "books": Book.objects.count(),
+            "users": User.objects.count(),
+            "borrowings": Borrowing.objects.count(),
+            "payments": Payment.objects.count(),
+        },
+        "transport": transport.name,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "seed": args.seed,
+    }
+
+
+def compare(report, baseline):
+    """Per-endpoint ratios of this run's numbers to the baseline's."""
+    changes = {}
+    for name, result in report["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before:
+            continue
+        changes[name] = {
+            key: round(result["latency_ms"][key] / before["latency_ms"][key], 3)
+            for key in ("p50", "p95", "p99")
+            if before["latency_ms"][key]
+        }
+        if result["queries"] and before["queries"]:
+            changes[name]["queries_delta"] = round(
+                result["queries"]["mean"] - before["queries"]["mean"], 2
+            )
+    return {"commit": baseline["meta"]["commit"], "ratios": changes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="benchmark a running server instead")
+    parser.add_argument(
+        "--endpoint", action="append", dest="endpoints",
+        choices=[endpoint.name for endpoint in ENDPOINTS],
+        help="only run the given endpoint, may be repeated",
+    )
+    parser.add_argument("--output", help="write the report to this file")
+    parser.add_argument("--baseline", help="compare with an earlier report")
+    args = parser.parse_args()
+
+    benchmarks.setup(THROTTLING=os.environ.get("THROTTLING", "False"))
+    transport = HTTPTransport(args.url) if args.url else ClientTransport()
+    state = State(args.seed)
+    authenticate(transport, state)
+
+    report = {"meta": describe_run(transport, args), "endpoints": {}}
+    started = time.perf_counter()
+    for endpoint in ENDPOINTS:
+        if args.endpoints and endpoint.name not in args.endpoints:
+            continue
+        print(f"{endpoint.name}...", file=sys.stderr)
+        report["endpoints"][endpoint.name] = measure(
+            transport, state, endpoint, args.requests, args.warmup
+        )
+    report["meta"]["seconds"] = round(time.perf_counter() - started, 1)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            report["baseline"] = compare(report, json.load(baseline))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
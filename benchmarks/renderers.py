@@ -0,0 +1,130 @@
+"""Throughput of the stdlib and orjson backed JSON renderer and parser.
+
+Renders list pages of ``--rows`` books and borrowings shaped like the API
+output, rows of raw dates and Decimals, and parses bulk borrowing request
+bodies with both classes. The outputs are compared before timing:
+
+    python -m benchmarks.renderers --rows 10000 --repeat 5
+"""
+import argparse
+import datetime
+import io
+import json
+from decimal import Decimal
+
+import benchmarks
+from benchmarks.serializers import best_of
+
+
+def book_rows(rows):
+    return [
+        {
+            "id": index,
+            "title": f"The Silent Kingdom {index}",
+            "author": "Taras Shevchenko",
+            "cover": "HR",
+            "inventory": index % 100,
+            "daily_fee": "1.50",
+        }
+        for index in range(1, rows + 1)
+    ]
+
+
+def borrowing_rows(rows, date=datetime.date.isoformat):
+    today = datetime.date(2024, 1, 1)
+    return [
+        {
+            "id": index,
+            "borrow_date": date(today - datetime.timedelta(days=index % 700)),
+            "expected_return_date": date(today),
+            "actual_return_date": None if index % 10 else date(today),
+            "book": index,
+            "user": index % 1000,
+        }
+        for index in range(1, rows + 1)
+    ]
+
+
+def fine_rows(rows):
+    """Raw dates and Decimals, which both classes hand to the DRF encoder."""
+    return [
+        {"borrowing": row, "fine": Decimal("12.50")}
+        for row in borrowing_rows(rows, date=lambda day: day)
+    ]
+
+
+def request_bodies(rows):
+    return [
+        json.dumps(
+            {"user": index, "books": list(range(index, index + 20)),
+             "expected_return_date": "2024-02-01"}
+        ).encode()
+        for index in range(rows // 20)
+    ]
+
+
+def measure(name, stdlib, fast, repeat, size):
+    if stdlib() != fast():
+        raise SystemExit(f"{name}: output differs")
+    stdlib_ms = best_of(repeat, lambda _: stdlib())
+    fast_ms = best_of(repeat, lambda _: fast())
+    return {
+        "payload": name,
+        "bytes": size,
+        "stdlib_ms": stdlib_ms,
+        "fast_ms": fast_ms,
+        "stdlib_mb_per_s": round(size / stdlib_ms / 1000, 1),
+        "fast_mb_per_s": round(size / fast_ms / 1000, 1),
+        "speedup": round(stdlib_ms / fast_ms, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    benchmarks.setup()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from library import renderers
+
+    if renderers.orjson is None:
+        raise SystemExit("orjson is not installed, FastJSONRenderer falls back")
+
+    report = []
+    for name, payload in (
+        ("books", {"next": None, "previous": None, "results": book_rows(args.rows)}),
+        ("borrowings", borrowing_rows(args.rows)),
+        ("raw dates and decimals", fine_rows(args.rows)),
+    ):
+        report.append(
+            measure(
+                f"render {name}",
+                lambda: JSONRenderer().render(payload),
+                lambda: renderers.FastJSONRenderer().render(payload),
+                args.repeat,
+                len(JSONRenderer().render(payload)),
+            )
+        )
+
+    bodies = request_bodies(args.rows)
+    report.append(
+        measure(
+            "parse bulk borrowings",
+            lambda: [JSONParser().parse(io.BytesIO(body)) for body in bodies],
+            lambda: [
+                renderers.FastJSONParser().parse(io.BytesIO(body))
+                for body in bodies
+            ],
+            args.repeat,
+            sum(map(len, bodies)),
+        )
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
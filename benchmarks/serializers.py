@@ -0,0 +1,116 @@
+"""Time ModelSerializer against ValuesSerializer on large list pages.
+
+Each serializer is timed on its own (rows already fetched) and end to end
+(fetch, serialize and render with DRF's JSONRenderer) against a fresh
+temporary database. The rendered bytes are compared before timing:
+
+    python -m benchmarks.serializers --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import benchmarks
+
+
+def best_of(repeat, function, prepare=lambda: None):
+    timings = []
+    for _ in range(repeat):
+        argument = prepare()
+        started = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 1)
+
+
+def compare(queryset, serializer_class, rows, repeat):
+    from rest_framework.renderers import JSONRenderer
+
+    from library.values import ValuesSerializer
+
+    renderer = JSONRenderer()
+    page = queryset.order_by("id")[:rows]
+    values_serializer = ValuesSerializer.for_serializer(serializer_class)
+    instances = list(page)
+    values = list(values_serializer.values(page))
+
+    def serialize_instances(objects):
+        return serializer_class(objects, many=True).data
+
+    def serialize_values(rows):
+        return values_serializer.to_representation(rows)
+
+    def model_path(_):
+        return renderer.render(serialize_instances(page.all()))
+
+    def values_path(_):
+        return renderer.render(
+            serialize_values(list(values_serializer.values(page)))
+        )
+
+    if model_path(None) != values_path(None):
+        raise SystemExit(f"{serializer_class.__name__}: output differs")
+
+    report = {
+        "serializer": serializer_class.__name__,
+        "rows": len(instances),
+        "serialize_model_ms": best_of(
+            repeat, serialize_instances, lambda: instances
+        ),
+        "serialize_values_ms": best_of(
+            repeat, serialize_values, lambda: [dict(row) for row in values]
+        ),
+        "end_to_end_model_ms": best_of(repeat, model_path),
+        "end_to_end_values_ms": best_of(repeat, values_path),
+    }
+    report["serialize_speedup"] = round(
+        report["serialize_model_ms"] / report["serialize_values_ms"], 1
+    )
+    report["end_to_end_speedup"] = round(
+        report["end_to_end_model_ms"] / report["end_to_end_values_ms"], 1
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        benchmarks.setup(DB_NAME=os.path.join(directory, "bench.sqlite3"))
+        from django.core.management import call_command
+
+        from benchmarks.datagen import generate
+        from books.models import Book
+        from books.serializers import BookSerializer
+        from borrowings.models import Borrowing
+        from borrowings.serializers import BorrowingSerializer
+        from payment.models import Payment
+        from payment.serializers import PaymentSerializer
+
+        call_command("migrate", verbosity=0)
+        generate(
+            books=args.rows,
+            users=100,
+            borrowings=args.rows,
+            payments=args.rows,
+            seed=0,
+            batch_size=10_000,
+            log=lambda message: None,
+        )
+        report = [
+            compare(Book.objects.all(), BookSerializer, args.rows, args.repeat),
+            compare(
+                Borrowing.objects.all(), BorrowingSerializer, args.rows, args.repeat
+            ),
+            compare(Payment.objects.all(), PaymentSerializer, args.rows, args.repeat),
+        ]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
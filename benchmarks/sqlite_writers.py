@@ -0,0 +1,140 @@
+"""Concurrent writer throughput of the stock and the tuned SQLite backend.
+
+Every worker process runs the bulk checkout path (a locked inventory read
+followed by writes), returns what it borrowed and reads a catalog page,
+in a loop, against a shared database file:
+
+    python -m benchmarks.sqlite_writers --workers 8 --seconds 10
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import benchmarks
+
+ENGINES = {
+    "stock": "django.db.backends.sqlite3",
+    "tuned": "library.sqlite",
+}
+
+
+def prepare(engine, path, books):
+    benchmarks.setup(DB_ENGINE=engine, DB_NAME=path)
+    from django.core.management import call_command
+
+    from books.models import Book
+    from users.models import User
+
+    call_command("migrate", verbosity=0)
+    User.objects.create_user(email="bench@example.com", password="bench")
+    Book.objects.bulk_create(
+        Book(
+            title=f"Book {index}",
+            author="Bench",
+            cover=Book.Cover.HARD,
+            inventory=1000,
+            daily_fee=1,
+        )
+        for index in range(books)
+    )
+
+
+def work(engine, path, seconds, seed, results):
+    benchmarks.setup(DB_ENGINE=engine, DB_NAME=path)
+    from django.db import OperationalError, transaction
+
+    from books.models import Book
+    from borrowings.models import Borrowing
+    from borrowings.serializers import BorrowingBulkCreateSerializer
+    from users.models import User
+
+    rng = random.Random(seed)
+    user = User.objects.get()
+    book_ids = list(Book.objects.values_list("id", flat=True))
+    due = datetime.date.today() + datetime.timedelta(days=7)
+    loops = locked = 0
+
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            serializer = BorrowingBulkCreateSerializer(
+                data={
+                    "user": user.pk,
+                    "books": rng.sample(book_ids, 2),
+                    "expected_return_date": due,
+                }
+            )
+            serializer.is_valid(raise_exception=True)
+            for result in serializer.save():
+                borrowing = result["borrowing"]
+                with transaction.atomic():
+                    Borrowing.objects.filter(pk=borrowing["id"]).update(
+                        actual_return_date=due
+                    )
+                    Book.objects.checkin(borrowing["book"])
+            list(Book.objects.all()[:50])
+            loops += 1
+        except OperationalError:
+            locked += 1
+    results.put((loops, locked))
+
+
+def run(variant, workers, seconds, books):
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.sqlite3")
+        engine = ENGINES[variant]
+
+        setup = context.Process(target=prepare, args=(engine, path, books))
+        setup.start()
+        setup.join()
+
+        results = context.Queue()
+        processes = [
+            context.Process(
+                target=work, args=(engine, path, seconds, seed, results)
+            )
+            for seed in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    loops = sum(done for done, _ in outcomes)
+    return {
+        "variant": variant,
+        "engine": engine,
+        "workers": workers,
+        "seconds": seconds,
+        "loops": loops,
+        "loops_per_second": round(loops / seconds, 1),
+        "locked_errors": sum(errors for _, errors in outcomes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument(
+        "--variant", choices=sorted(ENGINES), action="append", dest="variants"
+    )
+    args = parser.parse_args()
+
+    report = [
+        run(variant, args.workers, args.seconds, args.books)
+        for variant in args.variants or ("stock", "tuned")
+    ]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import codecs
+import csv
+import json
+import os
+
+from django.db import transaction
+from rest_framework import serializers
+
+from books.models import Book
+from books.serializers import BookSerializer
+from library.cache import invalidate
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+MAX_TRACKED_IDS = 100_000
+CHUNK_SIZE = 64 * 1024
+IMPORT_FIELDS = ("title", "author", "cover", "inventory", "daily_fee")
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+
+def guess_format(filename):
+    return FORMATS.get(os.path.splitext(filename)[1].lower())
+
+
+def _read_csv(lines):
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _read_jsonl(lines):
+    for line_num, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_num, row if isinstance(row, dict) else None
+
+
+READERS = {"csv": _read_csv, "jsonl": _read_jsonl}
+
+
+def is_utf8(chunks):
+    """Return whether the byte ``chunks`` decode as UTF-8, holding one at a time."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for chunk in chunks:
+            decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+class BookImporter:
+    """Validate rows with the BookSerializer field rules and upsert them in batches.
+
+    Rows with an ``id`` update that book, rows without one create a new book.
+    A row reusing an ``id`` from earlier in its batch, or one of the first
+    MAX_TRACKED_IDS ids of the file, is rejected; past that cap a repeated
+    id simply updates the book again. Only one batch is held in memory at
+    a time.
+    """
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        fields = BookSerializer().fields
+        self.fields = [(name, fields[name]) for name in IMPORT_FIELDS]
+        self.id_field = serializers.IntegerField(min_value=1)
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+        self.id_lines = {}
+
+    def summary(self):
+        return {
+            "created": self.created,
+            "updated": self.updated,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+    def reject(self, line, errors):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def validate(self, row):
+        values = {}
+        errors = {}
+        for name, field in self.fields:
+            try:
+                values[name] = field.run_validation(row.get(name, serializers.empty))
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+
+        book_id = row.get("id")
+        if book_id not in (None, ""):
+            try:
+                values["id"] = self.id_field.run_validation(book_id)
+            except serializers.ValidationError as exc:
+                errors["id"] = exc.detail
+        return values, errors
+
+    def remember(self, id_lines):
+        for book_id, line in id_lines.items():
+            if len(self.id_lines) >= MAX_TRACKED_IDS:
+                return
+            self.id_lines[book_id] = line
+
+    def run(self, lines, file_format):
+        if file_format not in READERS:
+            raise ValueError(f"Unsupported import format: {file_format!r}")
+
+        batch = []
+        batch_ids = {}
+        for line, row in READERS[file_format](lines):
+            if row is None:
+                self.reject(line, {"non_field_errors": ["Invalid JSON object."]})
+                continue
+
+            values, errors = self.validate(row)
+            if errors:
+                self.reject(line, errors)
+                continue
+
+            if "id" in values:
+                book_id = values["id"]
+                first_line = batch_ids.get(book_id) or self.id_lines.get(book_id)
+                if first_line:
+                    message = f"This id was already used on line {first_line}."
+                    self.reject(line, {"id": [message]})
+                    continue
+                batch_ids[book_id] = line
+
+            batch.append((line, values))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                self.remember(batch_ids)
+                batch = []
+                batch_ids = {}
+
+        if batch:
+            self.flush(batch)
+        return self.summary()
+
+    def flush(self, batch):
+        new_books = []
+        updates = {}
+        for line, values in batch:
+            book_id = values.pop("id", None)
+            if book_id is None:
+                new_books.append(Book(**values))
+            else:
+                updates[book_id] = (line, values)
+
+        with transaction.atomic():
+            existing = set(
+                Book.objects.filter(pk__in=updates).values_list("pk", flat=True)
+            )
+            changed_books = []
+            for book_id, (line, values) in updates.items():
+                if book_id in existing:
+                    changed_books.append(Book(pk=book_id, **values))
+                else:
+                    self.reject(line, {"id": ["Book with this id does not exist."]})
+
+            Book.objects.bulk_create(new_books)
+            Book.objects.bulk_update(changed_books, IMPORT_FIELDS)
+            invalidate("books")
+
+        self.created += len(new_books)
+        self.updated += len(changed_books)
+
+
+def import_books(lines, file_format, batch_size=DEFAULT_BATCH_SIZE):
+    return BookImporter(batch_size=batch_size).run(lines, file_format)
@@ -0,0 +1,46 @@
+import functools
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.importers import (
+    CHUNK_SIZE,
+    DEFAULT_BATCH_SIZE,
+    guess_format,
+    import_books,
+    is_utf8,
+)
+
+
+class Command(BaseCommand):
+    help = "Stream books from a CSV or JSONL file into the catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format",
+            dest="file_format",
+            choices=("csv", "jsonl"),
+            help="File format, guessed from the extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=DEFAULT_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        file_format = options["file_format"] or guess_format(options["path"])
+        if file_format is None:
+            raise CommandError("Cannot guess the file format, pass --format.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        # Check the encoding first, so no batch of a bad file is saved.
+        with open(options["path"], "rb") as file:
+            chunks = iter(functools.partial(file.read, CHUNK_SIZE), b"")
+            if not is_utf8(chunks):
+                raise CommandError(f"{options['path']} is not UTF-8 encoded.")
+
+        with open(options["path"], encoding="utf-8-sig", newline="") as lines:
+            summary = import_books(lines, file_format, options["batch_size"])
+
+        self.stdout.write(json.dumps(summary, indent=2))
@@ -1,7 +1,43 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Case, F, When
 from django.utils.translation import gettext_lazy as _
 
+from library.cache import invalidate
+
+
+class BookQuerySet(models.QuerySet):
+    def checkout(self, book_id):
+        """Take one copy of the book, return False if none are left."""
+        taken = self.filter(pk=book_id, inventory__gt=0).update(
+            inventory=F("inventory") - 1
+        )
+        if taken:
+            invalidate("books")
+        return bool(taken)
+
+    def checkout_many(self, counts):
+        """Take ``counts[book_id]`` copies of each book in one statement.
+
+        Availability must already have been checked under a row lock.
+        """
+        if counts:
+            self.filter(pk__in=counts).update(
+                inventory=Case(
+                    *[
+                        When(pk=book_id, then=F("inventory") - count)
+                        for book_id, count in counts.items()
+                    ],
+                    default=F("inventory"),
+                )
+            )
+            invalidate("books")
+
+    def checkin(self, book_id):
+        """Put one copy of the book back on the shelf."""
+        self.filter(pk=book_id).update(inventory=F("inventory") + 1)
+        invalidate("books")
+
 
 class Book(models.Model):
     class Cover(models.TextChoices):
@@ -14,5 +50,7 @@ class Book(models.Model):
     inventory = models.IntegerField(validators=[MinValueValidator(0)])
     daily_fee = models.DecimalField(max_digits=4, decimal_places=2)
 
+    objects = BookQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.author}: {self.title}"
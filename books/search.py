@@ -0,0 +1,60 @@
+import re
+
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, When
+
+SEARCH_RESULTS_LIMIT = 100
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _sqlite_ranked_ids(connection, terms, limit):
+    # Every term is quoted so user input can never reach the FTS5 query
+    # syntax; the last one is a prefix match to support search-as-you-type.
+    match = " ".join(f'"{term}"' for term in terms) + "*"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid FROM books_book_fts WHERE books_book_fts MATCH %s "
+            "ORDER BY bm25(books_book_fts, 10.0, 5.0) LIMIT %s",
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgresql_ranked_ids(connection, terms, limit):
+    query = " & ".join(terms) + ":*"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT id FROM books_book, to_tsquery('english', %s) query "
+            "WHERE search_vector @@ query "
+            "ORDER BY ts_rank(search_vector, query) DESC, id LIMIT %s",
+            [query, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_books(queryset, text, limit=SEARCH_RESULTS_LIMIT):
+    """Filter ``queryset`` to books matching ``text``, best matches first."""
+    terms = _TOKEN_RE.findall(text.lower())
+    if not terms:
+        return queryset.none()
+
+    connection = connections[queryset.db]
+    if connection.vendor == "sqlite":
+        ids = _sqlite_ranked_ids(connection, terms, limit)
+    elif connection.vendor == "postgresql":
+        ids = _postgresql_ranked_ids(connection, terms, limit)
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= Q(title__icontains=term) | Q(author__icontains=term)
+        return queryset.filter(condition).order_by("id")[:limit]
+
+    if not ids:
+        return queryset.none()
+
+    relevance = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(relevance)
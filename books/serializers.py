@@ -1,9 +1,10 @@
 from rest_framework import serializers
 
 from books.models import Book
+from library.metrics import TimedSerializerMixin
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = "__all__"
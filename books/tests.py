@@ -1,9 +1,17 @@
+import os
+import tempfile
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
 from django.test import TestCase
 from rest_framework_simplejwt.tokens import AccessToken
 from books.models import Book
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from books.serializers import BookSerializer
+from library.cache import cache_stats
 from users.models import User
 
 
@@ -54,8 +62,36 @@ class BookAPITests(APITestCase):
         response = self.client.get("/api/books/")
         books = Book.objects.all()
         serializer = BookSerializer(books, many=True)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data["results"], serializer.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_books_are_cursor_paginated(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.access_token)
+        response = self.client.get("/api/books/", {"page_size": 1})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]], [self.book1.pk]
+        )
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [book["id"] for book in response.data["results"]], [self.book2.pk]
+        )
+        self.assertIsNone(response.data["next"])
+
+    def test_fields_limits_the_columns(self):
+        response = self.client.get("/api/books/", {"fields": "title,inventory"})
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"title": "Test Book 1", "inventory": 1},
+                {"title": "Test Book 2", "inventory": 2},
+            ],
+        )
+
+        response = self.client.get("/api/books/", {"fields": "title,isbn"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_get_single_book(self):
         self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.access_token)
@@ -94,3 +130,272 @@ class BookAPITests(APITestCase):
         response = self.client.delete(f"/api/books/{self.book2.pk}/")
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Book.objects.filter(pk=self.book2.pk).exists())
+
+
+class BookSearchTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.dune = Book.objects.create(
+            title="Dune", author="Frank Herbert", cover="HR",
+            inventory=1, daily_fee=1.99,
+        )
+        self.messiah = Book.objects.create(
+            title="Dune Messiah", author="Frank Herbert", cover="ST",
+            inventory=1, daily_fee=1.99,
+        )
+        self.hobbit = Book.objects.create(
+            title="The Hobbit", author="J. R. R. Tolkien", cover="HR",
+            inventory=1, daily_fee=2.99,
+        )
+        self.user = User.objects.create_user(
+            email="reader@mail.com", password="test_password"
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def search(self, text):
+        response = self.client.get("/api/books/", {"search": text})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book["id"] for book in response.data]
+
+    def test_search_matches_title_and_author(self):
+        self.assertEqual(self.search("hobbit"), [self.hobbit.pk])
+        self.assertEqual(self.search("tolkien"), [self.hobbit.pk])
+
+    def test_search_ranks_by_relevance(self):
+        self.assertEqual(self.search("dune"), [self.dune.pk, self.messiah.pk])
+
+    def test_search_matches_prefix_of_last_term(self):
+        self.assertEqual(self.search("frank herb"), [self.dune.pk, self.messiah.pk])
+
+    def test_search_ignores_query_syntax(self):
+        self.assertEqual(self.search('"dune" OR NEAR('), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.hobbit.title = "The Silmarillion"
+        self.hobbit.save()
+        self.assertEqual(self.search("hobbit"), [])
+        self.assertEqual(self.search("silmarillion"), [self.hobbit.pk])
+
+        self.dune.delete()
+        self.assertEqual(self.search("dune"), [self.messiah.pk])
+
+
+class BookImportTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(
+            email="librarian@mail.com", password="test_password"
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.book = Book.objects.create(
+            title="Old Title", author="Old Author", cover="HR",
+            inventory=1, daily_fee=1.00,
+        )
+
+    def upload(self, name, content, **params):
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post(
+            "/api/books/import/?" + urlencode(params), {"file": upload}, format="multipart"
+        )
+
+    def test_import_csv(self):
+        content = (
+            "id,title,author,cover,inventory,daily_fee\n"
+            ",New Book,New Author,ST,4,0.50\n"
+            f"{self.book.pk},Updated Title,Updated Author,HR,7,2.25\n"
+            ",Bad Cover,Author,XX,1,1.00\n"
+            ",Negative,Author,HR,-1,1.00\n"
+            ",Too Precise,Author,HR,1,1.001\n"
+            "999999,Missing,Author,HR,1,1.00\n"
+        )
+        response = self.upload("books.csv", content, batch_size=2)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["rejected"], 4)
+        self.assertEqual(
+            [(error["line"], list(error["errors"])) for error in response.data["errors"]],
+            [(4, ["cover"]), (5, ["inventory"]), (6, ["daily_fee"]), (7, ["id"])],
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(
+            (self.book.title, self.book.inventory, str(self.book.daily_fee)),
+            ("Updated Title", 7, "2.25"),
+        )
+        self.assertTrue(Book.objects.filter(title="New Book", inventory=4).exists())
+
+    def test_import_jsonl(self):
+        content = (
+            '{"title": "Json Book", "author": "Author", "cover": "HR", "inventory": 2, "daily_fee": "1.50"}\n'
+            "\n"
+            "not json\n"
+            '{"title": "No Cover", "author": "Author", "inventory": 2, "daily_fee": "1.50"}\n'
+        )
+        response = self.upload("books.jsonl", content)
+
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["rejected"], 2)
+        self.assertEqual([error["line"] for error in response.data["errors"]], [3, 4])
+
+    def test_import_rejects_duplicate_ids(self):
+        content = (
+            "id,title,author,cover,inventory,daily_fee\n"
+            f"{self.book.pk},First,Author,HR,2,1.00\n"
+            f"{self.book.pk},Second,Author,HR,3,1.00\n"
+            f"{self.book.pk},Third,Author,HR,4,1.00\n"
+        )
+        response = self.upload("books.csv", content, batch_size=2)
+
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(response.data["rejected"], 2)
+        self.assertEqual(
+            [(error["line"], list(error["errors"])) for error in response.data["errors"]],
+            [(3, ["id"]), (4, ["id"])],
+        )
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.title, self.book.inventory), ("First", 2))
+
+    def test_repeated_ids_past_the_cap_update_again(self):
+        content = (
+            "id,title,author,cover,inventory,daily_fee\n"
+            f"{self.book.pk},First,Author,HR,2,1.00\n"
+            f"{self.book.pk},Second,Author,HR,3,1.00\n"
+            f"{self.book.pk},Third,Author,HR,4,1.00\n"
+        )
+        with mock.patch("books.importers.MAX_TRACKED_IDS", 0):
+            response = self.upload("books.csv", content, batch_size=1)
+
+        self.assertEqual(response.data["updated"], 3)
+        self.assertEqual(response.data["errors"], [])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.title, "Third")
+
+    def test_command_rejects_non_utf8_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "books.csv")
+            with open(path, "wb") as file:
+                file.write(
+                    b"title,author,cover,inventory,daily_fee\n"
+                    b"Before,Author,HR,1,1.00\n"
+                    b"Caf\xe9,Author,HR,1,1.00\n"
+                )
+            with self.assertRaisesMessage(CommandError, "is not UTF-8 encoded"):
+                call_command("import_books", path, "--batch-size", "1")
+
+        self.assertFalse(Book.objects.filter(title="Before").exists())
+
+    def test_import_rejects_non_utf8_file(self):
+        content = (
+            "title,author,cover,inventory,daily_fee\n"
+            "Before,Author,HR,1,1.00\n"
+            "Caf\xe9,Author,HR,1,1.00\n"
+        )
+        upload = SimpleUploadedFile("books.csv", content.encode("latin-1"))
+        response = self.client.post(
+            "/api/books/import/?batch_size=1", {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("file", response.data)
+        self.assertFalse(Book.objects.filter(title="Before").exists())
+
+    def test_import_rejects_unknown_format(self):
+        response = self.upload("books.xml", "<books/>")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_requires_admin(self):
+        self.client.force_authenticate(
+            user=User.objects.create_user(email="reader@mail.com", password="test_password")
+        )
+        response = self.upload("books.csv", "title\n")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BookCacheTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.book = Book.objects.create(
+            title="Cached Book", author="Author", cover="HR",
+            inventory=3, daily_fee=1.99,
+        )
+        self.admin = User.objects.create_superuser(
+            email="librarian@mail.com", password="test_password"
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        hits = cache_stats().get(("books", "hit"), 0)
+        first = self.client.get("/api/books/")
+        self.assertEqual(first["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/books/")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(cache_stats()[("books", "hit")], hits + 1)
+
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get("/api/books/", {"page_size": 1})
+        response = self.client.get("/api/books/", {"page_size": 2})
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_write_invalidates_cached_reads(self):
+        self.client.get(f"/api/books/{self.book.pk}/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/api/books/{self.book.pk}/", {"title": "Renamed"})
+
+        response = self.client.get(f"/api/books/{self.book.pk}/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["title"], "Renamed")
+
+    def test_inventory_change_invalidates_cached_reads(self):
+        self.client.get(f"/api/books/{self.book.pk}/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.checkout(self.book.pk)
+
+        response = self.client.get(f"/api/books/{self.book.pk}/")
+        self.assertEqual(response.data["inventory"], 2)
+
+
+class BookETagTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.book = Book.objects.create(
+            title="Polled Book", author="Author", cover="HR",
+            inventory=3, daily_fee=1.99,
+        )
+        self.client.force_authenticate(
+            user=User.objects.create_user(email="reader@mail.com", password="test_password")
+        )
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get("/api/books/")
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/books/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+    def test_etag_changes_with_the_catalog(self):
+        etag = self.client.get(f"/api/books/{self.book.pk}/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.checkout(self.book.pk)
+
+        response = self.client.get(f"/api/books/{self.book.pk}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etag_depends_on_query(self):
+        etag = self.client.get("/api/books/")["ETag"]
+        response = self.client.get("/api/books/", {"page_size": 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_wildcard_only_matches_an_existing_book(self):
+        response = self.client.get(f"/api/books/{self.book.pk}/", HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get("/api/books/999999/", HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
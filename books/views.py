@@ -1,10 +1,87 @@
+import io
+
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from books.importers import (
+    DEFAULT_BATCH_SIZE,
+    guess_format,
+    import_books,
+    is_utf8,
+)
 from books.permissions import IsAdminOrReadOnly
 from books.models import Book
+from books.search import search_books
 from books.serializers import BookSerializer
+from library.cache import VersionedCacheMixin
+from library.conditional import VersionETagMixin
+from library.db_routing import ReplicaRoutingMixin
+from library.pagination import IdCursorPagination
+from library.values import ValuesReadMixin
 
 
-class BooksViewSet(viewsets.ModelViewSet):
+class BooksViewSet(
+    VersionETagMixin,
+    VersionedCacheMixin,
+    ReplicaRoutingMixin,
+    ValuesReadMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    pagination_class = IdCursorPagination
+    cache_name = "books"
+    etag_versions = ("books",)
+    etag_per_user = False
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        search = self.request.query_params.get("search")
+
+        if search and self.action == "list":
+            return search_books(queryset, search)
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        # Search results are already capped and ordered by relevance,
+        # which the id-ordered cursor would discard.
+        if self.request.query_params.get("search"):
+            return None
+        return super().paginate_queryset(queryset)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=(IsAdminUser,),
+        parser_classes=(MultiPartParser,),
+    )
+    def import_books(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            raise ValidationError({"file": "No file was submitted."})
+
+        file_format = guess_format(upload.name)
+        if file_format is None:
+            raise ValidationError({"file": "Upload a .csv or .jsonl file."})
+
+        try:
+            batch_size = int(request.query_params.get("batch_size", DEFAULT_BATCH_SIZE))
+        except ValueError:
+            batch_size = 0
+        if batch_size < 1:
+            raise ValidationError({"batch_size": "A positive integer is required."})
+
+        # Check the encoding before importing, so an undecodable file is
+        # rejected before any of its batches are saved.
+        if not is_utf8(upload.chunks()):
+            raise ValidationError({"file": "The file is not UTF-8 encoded."})
+        upload.seek(0)
+
+        lines = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        return Response(import_books(lines, file_format, batch_size))
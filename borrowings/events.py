@@ -0,0 +1,30 @@
+from outbox.models import OutboxEvent
+
+
+def record_created(borrowings):
+    OutboxEvent.objects.record_many(
+        "borrowing.created",
+        [
+            {
+                "id": borrowing.pk,
+                "book": borrowing.book_id,
+                "user": borrowing.user_id,
+                "borrow_date": borrowing.borrow_date,
+                "expected_return_date": borrowing.expected_return_date,
+            }
+            for borrowing in borrowings
+        ],
+    )
+
+
+def record_returned(borrowing, returned_on):
+    OutboxEvent.objects.record(
+        "borrowing.returned",
+        {
+            "id": borrowing.pk,
+            "book": borrowing.book_id,
+            "user": borrowing.user_id,
+            "expected_return_date": borrowing.expected_return_date,
+            "actual_return_date": returned_on,
+        },
+    )
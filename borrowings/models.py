@@ -18,6 +18,24 @@ class Borrowing(models.Model):
         related_name="borrowings"
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["expected_return_date", "id"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_overdue_idx",
+            ),
+            models.Index(
+                fields=["user"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_active_user_idx",
+            ),
+            models.Index(
+                fields=["book", "actual_return_date"],
+                name="borrowing_book_return_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.book.title} was borrow {self.borrow_date} " \
                f"expected return {self.expected_return_date}"
@@ -1,16 +1,23 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.db import transaction
 from rest_framework import serializers
+from books.models import Book
+from borrowings.events import record_created
 from borrowings.models import Borrowing
+from library.cache import invalidate
+from library.metrics import TimedSerializerMixin
 
 
-class BorrowingSerializer(serializers.ModelSerializer):
+class BorrowingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Borrowing
         fields = "__all__"
 
 
-class BorrowingCreateSerializer(serializers.ModelSerializer):
+class BorrowingCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     def validate(self, attrs):
         if not attrs["book"].inventory:
@@ -19,10 +26,8 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         with transaction.atomic():
-            book = validated_data["book"]
-
-            book.inventory -= 1
-            book.save()
+            if not Book.objects.checkout(validated_data["book"].pk):
+                raise serializers.ValidationError("Book is not available")
 
             borrowing = Borrowing.objects.create(**validated_data)
 
@@ -34,7 +39,63 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
         read_only_fields = ("borrow_date",)
 
 
-class BorrowingReturnSerializer(serializers.ModelSerializer):
+class BorrowingBulkCreateSerializer(serializers.Serializer):
+    user = serializers.PrimaryKeyRelatedField(
+        queryset=get_user_model().objects.all()
+    )
+    books = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=50,
+    )
+    expected_return_date = serializers.DateField()
+
+    def create(self, validated_data):
+        book_ids = validated_data["books"]
+        results = []
+        borrowings = []
+        taken = Counter()
+
+        with transaction.atomic():
+            inventory = dict(
+                Book.objects.select_for_update()
+                .filter(pk__in=book_ids)
+                .values_list("pk", "inventory")
+            )
+            for book_id in book_ids:
+                if book_id not in inventory:
+                    results.append(
+                        {"book": book_id, "success": False, "error": "Book does not exist"}
+                    )
+                elif taken[book_id] >= inventory[book_id]:
+                    results.append(
+                        {"book": book_id, "success": False, "error": "Book is not available"}
+                    )
+                else:
+                    taken[book_id] += 1
+                    borrowing = Borrowing(
+                        book_id=book_id,
+                        user=validated_data["user"],
+                        expected_return_date=validated_data["expected_return_date"],
+                    )
+                    borrowings.append(borrowing)
+                    results.append(
+                        {"book": book_id, "success": True, "borrowing": borrowing}
+                    )
+
+            Book.objects.checkout_many(taken)
+            Borrowing.objects.bulk_create(borrowings)
+            if borrowings:
+                invalidate("borrowings")
+                record_created(borrowings)
+
+        for result in results:
+            if result["success"]:
+                result["borrowing"] = BorrowingSerializer(result["borrowing"]).data
+        return results
+
+
+class BorrowingReturnSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Borrowing
         fields = "__all__"
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from borrowings.events import record_created
+from borrowings.models import Borrowing
+from library.cache import invalidate
+
+
+@receiver(post_save, sender=Borrowing)
+@receiver(post_delete, sender=Borrowing)
+def invalidate_borrowings(sender, **kwargs):
+    invalidate("borrowings")
+
+
+@receiver(post_save, sender=Borrowing)
+def record_borrowing_created(sender, instance, created, **kwargs):
+    if created:
+        record_created([instance])
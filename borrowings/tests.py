@@ -1,13 +1,25 @@
+from unittest import skipUnless
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from drf_spectacular.generators import SchemaGenerator
 from rest_framework_simplejwt.tokens import AccessToken
 
 from users.models import User
 from books.models import Book
+from payment.models import Payment
+from tasks.models import Task
+from tasks.worker import execute
 from .models import Borrowing
+from .serializers import BorrowingCreateSerializer
 import datetime
+import json
+from decimal import Decimal
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 
 
 class BorrowingModelTest(TestCase):
@@ -93,19 +105,19 @@ class BorrowingListViewTest(TestCase):
         self.client.force_authenticate(user=self.admin)
         response = self.client.get('/api/borrowings/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_get_borrowings_as_user(self):
         self.client.force_authenticate(user=self.user)
         response = self.client.get('/api/borrowings/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_get_borrowings_filter_by_user_id(self):
         self.client.force_authenticate(user=self.admin)
         response = self.client.get('/api/borrowings/', {'user_id': self.user.id})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_create_borrowing(self):
         self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.access_token)
@@ -116,6 +128,31 @@ class BorrowingListViewTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Borrowing.objects.count(), 2)
 
+    def test_create_borrowing_decrements_inventory(self):
+        self.client.force_authenticate(user=self.user)
+        data = {'book': self.book.id, 'user': self.user.id,
+                'expected_return_date': str(timezone.now().date() + timezone.timedelta(days=3))}
+        response = self.client.post('/api/borrowings/create/', data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 4)
+
+    def test_create_borrowing_when_last_copy_was_taken_concurrently(self):
+        self.book.inventory = 1
+        self.book.save()
+        serializer = BorrowingCreateSerializer(data={
+            'book': self.book.id, 'user': self.user.id,
+            'expected_return_date': str(timezone.now().date() + timezone.timedelta(days=3)),
+        })
+        self.assertTrue(serializer.is_valid())
+        Book.objects.filter(pk=self.book.pk).update(inventory=0)
+
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(Borrowing.objects.count(), 1)
+
     def test_create_borrowing_with_invalid_book(self):
         self.client.force_authenticate(user=self.user)
         data = {'book': 123}
@@ -158,3 +195,461 @@ class BorrowingDetailViewTest(TestCase):
         self.client.force_authenticate(user=self.admin)
         response = self.client.delete(f'/api/borrowings/{self.borrowing.id}/')
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_anonymous_user_cannot_read_a_borrowing(self):
+        response = self.client.get(f'/api/borrowings/{self.borrowing.id}/?expand=user')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_can_only_read_own_borrowings(self):
+        user = User.objects.create_user(email='testuser@mail.com', password='testpass')
+        self.client.force_authenticate(user=user)
+        response = self.client.get(f'/api/borrowings/{self.borrowing.id}/?expand=user')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        own = Borrowing.objects.create(
+            book=self.book,
+            user=user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3)
+        )
+        response = self.client.get(f'/api/borrowings/{own.id}/?expand=user')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['email'], 'testuser@mail.com')
+
+
+class BorrowingReturnViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='reader@mail.com', password='testpass')
+        self.client = APIClient()
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="HR",
+            inventory=5,
+            daily_fee=1.99,
+        )
+        self.other_book = Book.objects.create(
+            title="Other Book",
+            author="Test Author",
+            cover="ST",
+            inventory=2,
+            daily_fee=0.99,
+        )
+        Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3)
+        )
+        self.borrowing = Borrowing.objects.create(
+            book=self.other_book,
+            user=self.user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3)
+        )
+
+    def test_return_marks_borrowing_and_restocks_its_book(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(f'/api/borrowings/{self.borrowing.id}/return/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['actual_return_date'], str(timezone.localdate()))
+
+        self.borrowing.refresh_from_db()
+        self.assertEqual(self.borrowing.actual_return_date, timezone.localdate())
+        self.other_book.refresh_from_db()
+        self.assertEqual(self.other_book.inventory, 3)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 5)
+        self.assertEqual(Borrowing.objects.count(), 2)
+
+    def test_return_twice(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.post(f'/api/borrowings/{self.borrowing.id}/return/')
+        response = self.client.post(f'/api/borrowings/{self.borrowing.id}/return/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.other_book.refresh_from_db()
+        self.assertEqual(self.other_book.inventory, 3)
+
+    def test_return_someone_elses_borrowing(self):
+        self.client.force_authenticate(
+            user=User.objects.create_user(email='other@mail.com', password='testpass')
+        )
+        response = self.client.post(f'/api/borrowings/{self.borrowing.id}/return/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_delete_restocks_the_borrowed_book(self):
+        self.client.force_authenticate(
+            user=User.objects.create_superuser(email='admin@mail.com', password='adminpass')
+        )
+        response = self.client.delete(f'/api/borrowings/{self.borrowing.id}/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.other_book.refresh_from_db()
+        self.assertEqual(self.other_book.inventory, 3)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 5)
+
+    def test_late_return_queues_a_fine(self):
+        Borrowing.objects.filter(pk=self.borrowing.pk).update(
+            expected_return_date=timezone.localdate() - timezone.timedelta(days=2)
+        )
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/borrowings/{self.borrowing.id}/return/')
+
+        [task] = Task.objects.claim(1, timezone.now() + timezone.timedelta(minutes=5))
+        self.assertEqual(task.name, 'payment.tasks.assess_late_return_fine')
+        self.assertTrue(execute(task))
+        fine = Payment.objects.get(borrowing=self.borrowing)
+        self.assertEqual(fine.type, Payment.Type.FINE)
+        self.assertEqual(fine.money_to_pay, Decimal('3.96'))
+
+    def test_return_on_time_queues_nothing(self):
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/borrowings/{self.borrowing.id}/return/')
+        self.assertFalse(Task.objects.exists())
+
+
+class BorrowingBulkCreateViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='patron@mail.com', password='testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="HR",
+            inventory=2,
+            daily_fee=1.99,
+        )
+        self.last_copy = Book.objects.create(
+            title="Last Copy",
+            author="Test Author",
+            cover="ST",
+            inventory=1,
+            daily_fee=0.99,
+        )
+        self.expected_return_date = str(timezone.now().date() + timezone.timedelta(days=7))
+
+    def test_bulk_create_reports_each_book(self):
+        data = {
+            'user': self.user.id,
+            'books': [self.book.id, self.last_copy.id, self.last_copy.id, 999999],
+            'expected_return_date': self.expected_return_date,
+        }
+        with self.assertNumQueries(7):
+            response = self.client.post('/api/borrowings/bulk-create/', data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [item['success'] for item in response.data], [True, True, False, False]
+        )
+        self.assertEqual(response.data[2]['error'], "Book is not available")
+        self.assertEqual(response.data[3]['error'], "Book does not exist")
+        self.assertEqual(response.data[0]['borrowing']['book'], self.book.id)
+        self.assertIsNotNone(response.data[0]['borrowing']['id'])
+
+        self.book.refresh_from_db()
+        self.last_copy.refresh_from_db()
+        self.assertEqual((self.book.inventory, self.last_copy.inventory), (1, 0))
+        self.assertEqual(Borrowing.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_same_book_twice(self):
+        data = {
+            'user': self.user.id,
+            'books': [self.book.id, self.book.id],
+            'expected_return_date': self.expected_return_date,
+        }
+        response = self.client.post('/api/borrowings/bulk-create/', data, format='json')
+        self.assertEqual([item['success'] for item in response.data], [True, True])
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_bulk_create_requires_books(self):
+        data = {'user': self.user.id, 'books': [], 'expected_return_date': self.expected_return_date}
+        response = self.client.post('/api/borrowings/bulk-create/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BorrowingExportViewTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email='admin@mail.com', password='adminpass')
+        self.user = User.objects.create_user(email='reader@mail.com', password='testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="HR",
+            inventory=5,
+            daily_fee=1.99,
+        )
+        self.old = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=datetime.date(2023, 1, 10),
+            actual_return_date=datetime.date(2023, 1, 9),
+        )
+        self.recent = Borrowing.objects.create(
+            book=self.book,
+            user=self.admin,
+            expected_return_date=datetime.date(2023, 3, 10),
+        )
+        Borrowing.objects.filter(pk=self.old.pk).update(borrow_date=datetime.date(2023, 1, 1))
+        Borrowing.objects.filter(pk=self.recent.pk).update(borrow_date=datetime.date(2023, 3, 1))
+
+    def export(self, **params):
+        response = self.client.get('/api/borrowings/export/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        lines = self.export().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0]), {
+            'id': self.old.id,
+            'borrow_date': '2023-01-01',
+            'expected_return_date': '2023-01-10',
+            'actual_return_date': '2023-01-09',
+            'book_id': self.book.id,
+            'book_title': 'Test Book',
+            'user_id': self.user.id,
+            'user_email': 'reader@mail.com',
+        })
+
+    def test_export_csv_filtered_by_date_range(self):
+        lines = self.export(output='csv', borrow_date_after='2023-02-01').splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['id', 'borrow_date'])
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith(f'{self.recent.id},2023-03-01,2023-03-10,,'))
+
+    def test_export_filtered_by_user(self):
+        lines = self.export(user_id=self.user.id).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.old.id])
+
+    def test_export_rejects_unknown_output(self):
+        response = self.client.get('/api/borrowings/export/', {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_requires_admin(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/borrowings/export/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_is_in_the_schema(self):
+        schema = SchemaGenerator().get_schema(request=None, public=True)
+        operation = schema['paths']['/api/borrowings/export/']['get']
+        self.assertEqual(
+            set(operation['responses']['200']['content']),
+            {'application/x-ndjson', 'text/csv'},
+        )
+
+
+class BorrowingETagTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='reader@mail.com', password='testpass')
+        self.admin = User.objects.create_superuser(email='admin@mail.com', password='adminpass')
+        self.client = APIClient()
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="HR",
+            inventory=5,
+            daily_fee=1.99,
+        )
+        self.borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3)
+        )
+
+    def test_matching_etag_is_not_modified(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get('/api/borrowings/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/borrowings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_is_per_user(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get('/api/borrowings/')['ETag']
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get('/api/borrowings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_return_changes_etag(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get('/api/borrowings/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/borrowings/{self.borrowing.id}/return/')
+        response = self.client.get('/api/borrowings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['results'][0]['actual_return_date'])
+
+
+class BorrowingFieldsAndExpandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='reader@mail.com', password='testpass')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.books = [
+            Book.objects.create(
+                title=f"Book {index}",
+                author="Test Author",
+                cover="HR",
+                inventory=5,
+                daily_fee="1.99",
+            )
+            for index in range(2)
+        ]
+        self.borrowings = [
+            Borrowing.objects.create(
+                book=book,
+                user=self.user,
+                expected_return_date=datetime.date(2024, 2, 1),
+            )
+            for book in self.books
+        ]
+
+    def test_fields_trims_columns_in_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/borrowings/?fields=book,expected_return_date')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['results'][0],
+            {'book': self.books[0].id, 'expected_return_date': '2024-02-01'},
+        )
+        [query] = queries.captured_queries
+        self.assertNotIn('actual_return_date', query['sql'])
+        self.assertNotIn('borrow_date', query['sql'])
+
+    def test_expand_embeds_relations_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/borrowings/?expand=book,user')
+
+        result = response.data['results'][0]
+        self.assertEqual(
+            result['book'],
+            {
+                'id': self.books[0].id,
+                'title': 'Book 0',
+                'author': 'Test Author',
+                'cover': 'HR',
+                'inventory': 5,
+                'daily_fee': '1.99',
+            },
+        )
+        self.assertEqual(
+            result['user'],
+            {'id': self.user.id, 'email': 'reader@mail.com', 'is_staff': False},
+        )
+        self.assertEqual(result['id'], self.borrowings[0].id)
+
+    def test_fields_and_expand_combine(self):
+        response = self.client.get(
+            f'/api/borrowings/{self.borrowings[1].id}/?fields=id,book&expand=book'
+        )
+
+        self.assertEqual(list(response.data), ['id', 'book'])
+        self.assertEqual(response.data['book']['title'], 'Book 1')
+
+    def test_pagination_without_the_id_field(self):
+        response = self.client.get('/api/borrowings/?fields=book&page_size=1')
+        self.assertEqual(response.data['results'], [{'book': self.books[0].id}])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'], [{'book': self.books[1].id}])
+
+    def test_unknown_fields_and_expansions_are_rejected(self):
+        response = self.client.get('/api/borrowings/?fields=id,secret')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('secret', response.data['fields'])
+
+        response = self.client.get('/api/borrowings/?expand=payments')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('payments', response.data['expand'])
+
+    def test_expanded_etag_follows_the_embedded_books(self):
+        etag = self.client.get('/api/borrowings/')['ETag']
+        expanded_etag = self.client.get('/api/borrowings/?expand=book')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[0].title = "Renamed"
+            self.books[0].save()
+
+        response = self.client.get('/api/borrowings/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(
+            '/api/borrowings/?expand=book', HTTP_IF_NONE_MATCH=expanded_etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['book']['title'], 'Renamed')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class BorrowingQueryPlanTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='reader@mail.com', password='testpass')
+        self.admin = User.objects.create_superuser(email='admin@mail.com', password='adminpass')
+        self.client = APIClient()
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="HR",
+            inventory=5,
+            daily_fee=1.99,
+        )
+        self.borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=timezone.now().date() + timezone.timedelta(days=3)
+        )
+
+    def borrowing_plans(self, request):
+        with CaptureQueriesContext(connection) as context:
+            request()
+        plans = []
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query['sql']
+                if 'borrowings_borrowing' in sql and sql.startswith(('SELECT', 'UPDATE')):
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plans.append(' | '.join(row[-1] for row in cursor.fetchall()))
+        self.assertTrue(plans)
+        return plans
+
+    def assertUsesIndex(self, plan, index):
+        self.assertIn(f'USING INDEX {index}', plan)
+        self.assertNotIn('SCAN borrowings_borrowing', plan)
+
+    def test_active_loans_of_a_user(self):
+        self.client.force_authenticate(user=self.user)
+        plans = self.borrowing_plans(
+            lambda: self.client.get('/api/borrowings/', {'is_active': 'true'})
+        )
+        self.assertUsesIndex(plans[0], 'borrowing_active_user_idx')
+
+    def test_active_loans_filtered_by_staff(self):
+        self.client.force_authenticate(user=self.admin)
+        plans = self.borrowing_plans(
+            lambda: self.client.get('/api/borrowings/', {'user_id': self.user.id, 'is_active': 'true'})
+        )
+        self.assertUsesIndex(plans[0], 'borrowing_active_user_idx')
+
+    def test_active_loans_of_a_book(self):
+        plan = Borrowing.objects.filter(book=self.book, actual_return_date__isnull=True).explain()
+        self.assertUsesIndex(plan, 'borrowing_book_return_idx')
+
+    def test_overdue_loans(self):
+        plan = Borrowing.objects.filter(
+            actual_return_date__isnull=True, expected_return_date__lt=timezone.now().date()
+        ).order_by('expected_return_date', 'id').explain()
+        self.assertUsesIndex(plan, 'borrowing_overdue_idx')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_return_touches_a_single_row(self):
+        self.client.force_authenticate(user=self.user)
+        plans = self.borrowing_plans(
+            lambda: self.client.post(f'/api/borrowings/{self.borrowing.id}/return/')
+        )
+        for plan in plans:
+            self.assertIn('USING INTEGER PRIMARY KEY', plan)
+            self.assertNotIn('SCAN borrowings_borrowing', plan)
@@ -4,12 +4,26 @@ from borrowings.views import (
     BorrowingListView,
     BorrowingDetailView,
     BorrowingCreateView,
+    BorrowingBulkCreateView,
+    BorrowingExportView,
+    BorrowingReturnView,
 )
 
 urlpatterns = [
     path("", BorrowingListView.as_view(), name="borrowing-list"),
     path("<int:pk>/", BorrowingDetailView.as_view(), name="borrowing-detail"),
     path("create/", BorrowingCreateView.as_view(), name="borrowing-create"),
+    path(
+        "bulk-create/",
+        BorrowingBulkCreateView.as_view(),
+        name="borrowing-bulk-create",
+    ),
+    path("export/", BorrowingExportView.as_view(), name="borrowing-export"),
+    path(
+        "<int:pk>/return/",
+        BorrowingReturnView.as_view(),
+        name="borrowing-return",
+    ),
 ]
 
 app_name = "borrowings"
@@ -1,26 +1,60 @@
 from django.db import transaction
-from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
+from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 
+from books.models import Book
+from books.serializers import BookSerializer
+from borrowings.events import record_returned
+from borrowings.exports import EXPORT_FORMATS, export_rows
 from borrowings.models import Borrowing
 from borrowings.serializers import (
     BorrowingSerializer,
     BorrowingCreateSerializer,
+    BorrowingBulkCreateSerializer,
     BorrowingReturnSerializer,
 )
 from books.permissions import IsAdminOrReadOnly
+from idempotency.mixins import IdempotentCreateMixin
+from library.cache import invalidate
+from library.conditional import VersionETagMixin
+from library.db_routing import ReplicaRoutingMixin
+from library.pagination import IdCursorPagination
+from library.values import ValuesReadMixin
+from payment.tasks import assess_late_return_fine
+from users.serializers import UserSerializer
 from django_filters import rest_framework as filters
 
 
 class BorrowingFilter(filters.FilterSet):
     user_id = filters.NumberFilter(field_name="user")
+    borrow_date = filters.DateFromToRangeFilter()
+    is_active = filters.BooleanFilter(
+        field_name="actual_return_date", lookup_expr="isnull"
+    )
 
 
-class BorrowingListView(generics.ListAPIView):
+class BorrowingListView(
+    VersionETagMixin, ReplicaRoutingMixin, ValuesReadMixin, generics.ListAPIView
+):
     queryset = Borrowing.objects.all()
     serializer_class = BorrowingSerializer
     permission_classes = (IsAuthenticated,)
     filterset_class = BorrowingFilter
+    pagination_class = IdCursorPagination
+    expandable_fields = {"book": BookSerializer, "user": UserSerializer}
+    etag_versions = ("borrowings",)
+
+    def get_etag_versions(self):
+        expanded = {"book": "books", "user": "users"}
+        return self.etag_versions + tuple(
+            expanded[name] for name in self.get_expand()
+        )
 
     def get_queryset(self):
         user = self.request.user
@@ -28,25 +62,108 @@ class BorrowingListView(generics.ListAPIView):
 
         if user.is_staff:
             return queryset
-        return queryset.filter(user__email=user.email)
+        return queryset.filter(user_id=user.id)
+
+
+class BorrowingExportView(generics.GenericAPIView):
+    queryset = Borrowing.objects.all()
+    permission_classes = (IsAdminUser,)
+    filterset_class = BorrowingFilter
+
+    @extend_schema(
+        parameters=[OpenApiParameter("output", enum=list(EXPORT_FORMATS))],
+        responses={
+            (200, content_type): OpenApiTypes.STR
+            for _, content_type, _ in EXPORT_FORMATS.values()
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get("output", "ndjson")
+        if output not in EXPORT_FORMATS:
+            raise ValidationError(
+                {"output": f"Choose one of: {', '.join(EXPORT_FORMATS)}."}
+            )
 
+        stream, content_type, filename = EXPORT_FORMATS[output]
+        rows = export_rows(self.filter_queryset(self.get_queryset()))
+        response = StreamingHttpResponse(stream(rows), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
 
-class BorrowingDetailView(generics.RetrieveDestroyAPIView):
+
+class BorrowingDetailView(
+    ReplicaRoutingMixin, ValuesReadMixin, generics.RetrieveDestroyAPIView
+):
     queryset = Borrowing.objects.all()
     serializer_class = BorrowingReturnSerializer
-    permission_classes = (IsAdminOrReadOnly,)
+    permission_classes = (IsAuthenticated, IsAdminOrReadOnly)
+    expandable_fields = {"book": BookSerializer, "user": UserSerializer}
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = self.queryset
+
+        if user.is_staff:
+            return queryset
+        return queryset.filter(user_id=user.id)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            if instance.actual_return_date is None:
+                Book.objects.checkin(instance.book_id)
+            instance.delete()
 
-    def delete(self, request, *args, **kwargs):
-        for borrowing in self.queryset.all():
-            with transaction.atomic():
-                borrowing.book.inventory += 1
 
-                borrowing.book.save()
+class BorrowingReturnView(ReplicaRoutingMixin, generics.GenericAPIView):
+    serializer_class = BorrowingSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Borrowing.objects.all()
+
+        if user.is_staff:
+            return queryset
+        return queryset.filter(user_id=user.id)
 
-                return self.destroy(request, *args, **kwargs)
+    def post(self, request, *args, **kwargs):
+        borrowing = self.get_object()
+        today = timezone.localdate()
 
+        with transaction.atomic():
+            returned = Borrowing.objects.filter(
+                pk=borrowing.pk, actual_return_date__isnull=True
+            ).update(actual_return_date=today)
+            if not returned:
+                raise ValidationError("Borrowing has already been returned")
+            invalidate("borrowings")
 
-class BorrowingCreateView(generics.CreateAPIView):
+            Book.objects.checkin(borrowing.book_id)
+            record_returned(borrowing, today)
+            if today > borrowing.expected_return_date:
+                assess_late_return_fine.enqueue(borrowing_id=borrowing.pk)
+
+        borrowing.actual_return_date = today
+        return Response(self.get_serializer(borrowing).data)
+
+
+class BorrowingCreateView(
+    IdempotentCreateMixin, ReplicaRoutingMixin, generics.CreateAPIView
+):
     queryset = Borrowing.objects.all()
     serializer_class = BorrowingCreateSerializer
     permission_classes = (IsAuthenticated,)
+    idempotency_scope = "borrowings.create"
+    throttle_scope = "borrowings.create"
+
+
+class BorrowingBulkCreateView(ReplicaRoutingMixin, generics.GenericAPIView):
+    serializer_class = BorrowingBulkCreateSerializer
+    permission_classes = (IsAuthenticated,)
+    throttle_scope = "borrowings.create"
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = serializer.save()
+        return Response(results, status=status.HTTP_201_CREATED)
@@ -0,0 +1,5 @@
+from django.contrib import admin
+from idempotency.models import IdempotencyKey
+
+
+admin.site.register(IdempotencyKey)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from idempotency.models import DEFAULT_CHUNK_SIZE, IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete idempotency keys past their expiry. Safe to re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        deleted = IdempotencyKey.objects.purge_expired(options["chunk_size"])
+        self.stdout.write(f"Deleted {deleted} expired idempotency keys.")
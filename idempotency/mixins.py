@@ -0,0 +1,112 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.http import QueryDict
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from idempotency.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used with a different request."
+    default_code = "idempotency_key_reused"
+
+
+class IdempotencyKeyInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still being processed."
+    default_code = "idempotency_key_in_progress"
+
+
+def request_hash(data):
+    if isinstance(data, QueryDict):
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """Run ``create`` at most once per ``Idempotency-Key`` header and user.
+
+    The key is claimed, the object created and the response stored in one
+    transaction, so a retry either replays the stored response or, if the
+    first attempt failed, runs again from scratch. Requests without the
+    header are handled as before.
+    """
+
+    idempotency_scope = None
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None or not request.user.is_authenticated:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError(
+                {IDEMPOTENCY_HEADER: f"Must be 1 to {MAX_KEY_LENGTH} characters."}
+            )
+
+        with transaction.atomic():
+            fingerprint = request_hash(request.data)
+            record, claimed = self.claim_idempotency_key(key, fingerprint)
+            if not claimed:
+                return self.replay(record)
+
+            response = super().create(request, *args, **kwargs)
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=["status_code", "response"])
+        return response
+
+    def claim_idempotency_key(self, key, fingerprint):
+        """Return the key's row and whether this request inserted it."""
+        lookup = {
+            # pk, since stateless JWT auth gives a ClaimsUser, not a User.
+            "user_id": self.request.user.pk,
+            "scope": self.idempotency_scope,
+            "key": key,
+        }
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+
+        record = IdempotencyKey.objects.filter(**lookup).first()
+        if record is not None and record.expires_at <= now:
+            record.delete()
+            record = None
+
+        if record is None:
+            try:
+                with transaction.atomic():
+                    return (
+                        IdempotencyKey.objects.create(
+                            **lookup, request_hash=fingerprint, expires_at=expires_at
+                        ),
+                        True,
+                    )
+            except IntegrityError:
+                # A concurrent request with the same key committed first.
+                record = IdempotencyKey.objects.get(**lookup)
+
+        if record.request_hash != fingerprint:
+            raise IdempotencyKeyReused()
+        return record, False
+
+    def replay(self, record):
+        if record.status_code is None:
+            raise IdempotencyKeyInProgress()
+        return Response(
+            record.response,
+            status=record.status_code,
+            headers={REPLAYED_HEADER: "true"},
+        )
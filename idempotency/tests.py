@@ -0,0 +1,174 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from books.models import Book
+from borrowings.models import Borrowing
+from idempotency.models import IdempotencyKey
+from payment.models import Payment
+from users.authentication import StatelessJWTAuthentication
+from users.models import User
+
+
+class IdempotentCreateTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="user@example.com", password="pass")
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com", password="pass"
+        )
+        self.book = Book.objects.create(
+            title="Book", author="Author", cover="HR", inventory=1, daily_fee=1
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.data = {
+            "book": self.book.id,
+            "user": self.user.id,
+            "expected_return_date": str(timezone.localdate() + datetime.timedelta(days=3)),
+        }
+
+    def borrow(self, key, data=None):
+        return self.client.post(
+            "/api/borrowings/create/",
+            data or self.data,
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.borrow("retry-1")
+        second = self.borrow("retry-1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertFalse(first.has_header("Idempotent-Replayed"))
+        self.assertEqual(Borrowing.objects.count(), 1)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_reusing_a_key_for_another_request_is_rejected(self):
+        self.book.inventory = 2
+        self.book.save()
+        self.borrow("reused")
+
+        data = {**self.data, "expected_return_date": "2030-01-01"}
+        response = self.borrow("reused", data)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Borrowing.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        self.book.inventory = 2
+        self.book.save()
+        self.borrow("shared")
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.borrow("shared")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Borrowing.objects.count(), 2)
+
+    def test_failed_request_is_not_stored(self):
+        self.book.inventory = 0
+        self.book.save()
+        response = self.borrow("failed")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.book.inventory = 1
+        self.book.save()
+        response = self.borrow("failed")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Borrowing.objects.count(), 1)
+
+    def test_expired_key_runs_again(self):
+        self.book.inventory = 2
+        self.book.save()
+        self.borrow("expired")
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+
+        response = self.borrow("expired")
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        self.assertEqual(Borrowing.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_without_header_every_request_runs(self):
+        self.book.inventory = 2
+        self.book.save()
+        for _ in range(2):
+            self.client.post("/api/borrowings/create/", self.data, format="json")
+        self.assertEqual(Borrowing.objects.count(), 2)
+
+    def test_oversized_key_is_rejected(self):
+        response = self.borrow("k" * 256)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Borrowing.objects.count(), 0)
+
+    def test_stateless_token_user(self):
+        self.book.inventory = 2
+        self.book.save()
+        token = AccessToken.for_user(self.user)
+        token["email"] = self.user.email
+        token["is_staff"] = False
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        with mock.patch.object(
+            APIView, "authentication_classes", (StatelessJWTAuthentication,)
+        ):
+            responses = [
+                client.post(
+                    "/api/borrowings/create/",
+                    self.data,
+                    format="json",
+                    HTTP_IDEMPOTENCY_KEY="stateless",
+                )
+                for _ in range(2)
+            ]
+
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [status.HTTP_201_CREATED] * 2,
+        )
+        self.assertEqual(responses[1]["Idempotent-Replayed"], "true")
+        self.assertEqual(Borrowing.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().user, self.user)
+
+    def test_payment_create(self):
+        self.client.force_authenticate(user=self.admin)
+        data = {"status": Payment.Status.PENDING, "type": Payment.Type.PAYMENT}
+        for _ in range(2):
+            response = self.client.post(
+                "/api/payments/", data, format="json", HTTP_IDEMPOTENCY_KEY="pay-1"
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Payment.objects.count(), 1)
+
+
+class PurgeIdempotencyKeysTest(TestCase):
+    def test_purges_only_expired_keys(self):
+        user = User.objects.create_user(email="user@example.com", password="pass")
+        now = timezone.now()
+        for index, expires_at in enumerate(
+            [now - datetime.timedelta(hours=1)] * 3 + [now + datetime.timedelta(hours=1)]
+        ):
+            IdempotencyKey.objects.create(
+                user=user,
+                scope="borrowings.create",
+                key=str(index),
+                request_hash="",
+                expires_at=expires_at,
+            )
+
+        out = StringIO()
+        call_command("purge_idempotency_keys", "--chunk-size", "2", stdout=out)
+        self.assertIn("Deleted 3 expired idempotency keys.", out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["3"])
@@ -0,0 +1,102 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+from library.db_routing import read_from_primary
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _version_key(name):
+    return f"version:{name}"
+
+
+def get_version(name):
+    """Return the current change counter of ``name``.
+
+    A missing counter restarts from the current time in milliseconds, so
+    it never falls back to a value that entries may already be stored under.
+    """
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        version = int(time.time() * 1000)
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(name):
+    try:
+        cache.incr(_version_key(name))
+    except ValueError:
+        get_version(name)
+
+
+def invalidate(name):
+    """Bump ``name`` now and again once the current transaction commits.
+
+    The second bump drops anything cached from the old rows by a reader
+    that ran between the first bump and the commit.
+    """
+    bump_version(name)
+    transaction.on_commit(lambda: bump_version(name))
+
+
+def record(name, event):
+    with _stats_lock:
+        _stats[name, event] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+class VersionedCacheMixin:
+    """Cache list and retrieve responses until a tracked version changes.
+
+    A miss is read from the primary: a lagging replica could return rows
+    older than the version the entry is stored under.
+    """
+
+    cache_name = None
+    cache_timeout = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        params = sorted(request.query_params.lists())
+        digest = hashlib.md5(
+            f"{self.action}:{request.path}:{params}".encode()
+        ).hexdigest()
+        return f"response:{self.cache_name}:{get_version(self.cache_name)}:{digest}"
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            record(self.cache_name, "hit")
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        record(self.cache_name, "miss")
+        with read_from_primary():
+            response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            timeout = self.cache_timeout
+            if timeout is None:
+                timeout = settings.RESPONSE_CACHE_TIMEOUT
+            cache.set(key, response.data, timeout)
+            response["X-Cache"] = "MISS"
+        return response
@@ -0,0 +1,88 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+_use_replicas = ContextVar("use_replicas", default=False)
+
+
+@contextmanager
+def read_from_replicas():
+    token = _use_replicas.set(True)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    token = _use_replicas.set(False)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+def reads_from_replicas():
+    """Whether reads in the current context may be served by a lagging replica."""
+    return bool(_use_replicas.get() and settings.DATABASE_REPLICAS)
+
+
+def _pin_key(user):
+    return f"replica-pin:{user.pk}"
+
+
+def pin_to_primary(user):
+    """Send ``user``'s reads to the primary for REPLICA_PIN_SECONDS."""
+    if settings.DATABASE_REPLICAS and user.is_authenticated:
+        cache.set(_pin_key(user), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(_pin_key(user), False)
+
+
+class PrimaryReplicaRouter:
+    """Route reads to a random replica inside read_from_replicas(), the rest to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _use_replicas.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMixin:
+    """Serve safe requests from replicas and pin a user to the primary after a write."""
+
+    _replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method in SAFE_METHODS
+            and not is_pinned(request.user)
+        ):
+            self._replica_token = _use_replicas.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_token is not None:
+            _use_replicas.reset(self._replica_token)
+            self._replica_token = None
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,243 @@
+import threading
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.db import connections
+
+from library import slow_queries
+from library.cache import cache_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_timings = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    __slots__ = (
+        "request", "queries", "db", "serialize", "render", "serializing",
+        "rendering", "explaining",
+    )
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.serializing = None
+        self.rendering = None
+        self.explaining = False
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket{_labels(labels, le=bound)} {cumulative}"
+                )
+            yield f"{self.name}_sum{_labels(labels)} {total}"
+            yield f"{self.name}_count{_labels(labels)} {cumulative}"
+
+
+class Registry:
+    """Per-process request histograms, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.duration = Histogram(
+            "http_request_duration_seconds",
+            "Total time spent handling the request.",
+            LATENCY_BUCKETS,
+        )
+        self.db = Histogram(
+            "http_request_db_seconds",
+            "Time spent in database queries.",
+            LATENCY_BUCKETS,
+        )
+        self.queries = Histogram(
+            "http_request_db_queries",
+            "Database queries executed by the request.",
+            QUERY_BUCKETS,
+        )
+        self.serialize = Histogram(
+            "http_request_serialize_seconds",
+            "Time spent turning objects into response data.",
+            LATENCY_BUCKETS,
+        )
+        self.render = Histogram(
+            "http_request_render_seconds",
+            "Time spent rendering the response body.",
+            LATENCY_BUCKETS,
+        )
+
+    def observe(self, view, method, status, total, timings):
+        labels = (("view", view), ("method", method))
+        with self.lock:
+            key = (*labels, ("status", str(status)))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.duration.observe(labels, total)
+            self.db.observe(labels, timings.db)
+            self.queries.observe(labels, timings.queries)
+            self.serialize.observe(labels, timings.serialize)
+            self.render.observe(labels, timings.render)
+
+    def expose(self):
+        with self.lock:
+            lines = [
+                "# HELP http_requests_total Requests handled.",
+                "# TYPE http_requests_total counter",
+            ]
+            lines += [
+                f"http_requests_total{_labels(labels)} {count}"
+                for labels, count in sorted(self.requests.items())
+            ]
+            for histogram in (
+                self.duration, self.db, self.queries, self.serialize, self.render
+            ):
+                lines += histogram.expose()
+
+        lines += [
+            "# HELP response_cache_events_total Response cache lookups.",
+            "# TYPE response_cache_events_total counter",
+        ]
+        lines += [
+            f"response_cache_events_total"
+            f"{_labels((('cache', name), ('event', event)))} {count}"
+            for (name, event), count in sorted(cache_stats().items())
+        ]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    return "{" + ",".join(
+        f'{name}="{_escape(value)}"' for name, value in pairs
+    ) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None or timings.explaining:
+        return execute(sql, params, many, context)
+
+    started = perf_counter()
+    try:
+        result = execute(sql, params, many, context)
+    finally:
+        elapsed = perf_counter() - started
+        timings.db += elapsed
+        timings.queries += 1
+
+    if slow_queries.is_slow(elapsed):
+        slow_queries.record(
+            context["connection"], sql, params, many, elapsed, timings
+        )
+    return result
+
+
+class TimedSerializerMixin:
+    """Count time spent in ``to_representation`` as serialization.
+
+    Only the outermost call is timed, so nested serializers and list items
+    are not counted twice.
+    """
+
+    def to_representation(self, instance):
+        timings = _timings.get()
+        if timings is None or timings.serializing:
+            return super().to_representation(instance)
+
+        timings.serializing = type(self).__name__
+        started = perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            timings.serialize += perf_counter() - started
+            timings.serializing = None
+
+
+class RequestMetricsMiddleware:
+    """Time each request and add a Server-Timing header.
+
+    Database time comes from an execute wrapper on every connection, which
+    also hands queries over SLOW_QUERY_MS to the slow query sampler.
+    Serialization time comes from ``TimedSerializerMixin``, and render time
+    from the template response render hook. The numbers also go into the
+    histograms served by the metrics view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings(request)
+        token = _timings.set(timings)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_time_query))
+                response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        total = perf_counter() - started
+
+        match = request.resolver_match
+        registry.observe(
+            match.view_name if match else "unmatched",
+            request.method,
+            response.status_code,
+            total,
+            timings,
+        )
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries"',
+                f"serialize;dur={timings.serialize * 1000:.2f}",
+                f"render;dur={timings.render * 1000:.2f}",
+                f"total;dur={total * 1000:.2f}",
+            ]
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        timings = _timings.get()
+        if timings is not None:
+            timings.rendering = perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: _finish_render(timings)
+            )
+        return response
+
+
+def _finish_render(timings):
+    timings.render += perf_counter() - timings.rendering
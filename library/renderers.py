@@ -0,0 +1,80 @@
+import io
+import re
+
+from django.conf import settings
+from rest_framework import parsers, renderers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Dates and times go through the DRF encoder so their format is unchanged.
+    ORJSON_OPTIONS = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+# orjson reads integers that do not fit in 64 bits as floats.
+WIDE_INTEGER = re.compile(rb"\d{19}")
+LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """JSONRenderer that encodes with orjson when it is installed.
+
+    Anything orjson cannot reproduce byte for byte falls back to the stdlib
+    path: indented output, non-compact or ASCII-only settings, and values
+    orjson refuses such as integers wider than 64 bits. Types orjson does
+    not know, including Decimal and the date types, are handed to
+    ``encoder_class().default`` like json.dumps does. Two differences
+    remain: non-finite floats become null instead of raising, and floats
+    that need an exponent are written in orjson's shorter notation.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=ORJSON_OPTIONS
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same escaping of U+2028 and U+2029 as JSONRenderer.
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in ret:
+                ret = ret.replace(separator, escaped)
+        return ret
+
+
+class FastJSONParser(parsers.JSONParser):
+    """JSONParser that decodes UTF-8 bodies with orjson when it is installed.
+
+    Bodies orjson rejects are parsed again by JSONParser, so errors and the
+    edge cases orjson is stricter about, such as lone surrogates, behave as
+    before. Bodies with 19 or more consecutive digits go straight to
+    JSONParser, which keeps integers wider than 64 bits exact.
+    """
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower() not in ("utf-8", "utf8"):
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if WIDE_INTEGER.search(body):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
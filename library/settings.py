@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 from datetime import timedelta
+from decimal import Decimal
 from pathlib import Path
 from dotenv import load_dotenv
 import os
@@ -47,9 +48,13 @@ INSTALLED_APPS = [
     "users",
     "borrowings",
     "payment",
+    "idempotency",
+    "tasks",
+    "outbox",
 ]
 
 MIDDLEWARE = [
+    "library.metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -61,6 +66,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "library.urls"
 
+# Addresses allowed to scrape /metrics.
+INTERNAL_IPS = os.getenv("INTERNAL_IPS", "127.0.0.1").split(",")
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -79,26 +87,131 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "library.wsgi.application"
 
+# "database" loads the user row on every request, "stateless" trusts the
+# email/is_staff claims in the token and "cached" keeps users in a short
+# per-process cache.
+JWT_AUTH_MODE = os.getenv("JWT_AUTH_MODE", "database")
+JWT_AUTHENTICATION_CLASSES = {
+    "database": "rest_framework_simplejwt.authentication.JWTAuthentication",
+    "stateless": "users.authentication.StatelessJWTAuthentication",
+    "cached": "users.authentication.CachedJWTAuthentication",
+}
+JWT_USER_CACHE_TTL = int(os.getenv("JWT_USER_CACHE_TTL", 30))
+
+# "fast" encodes and decodes JSON with orjson when it is installed, with
+# the same output as the stdlib based DRF classes.
+JSON_BACKEND = os.getenv("JSON_BACKEND", "stdlib")
+JSON_RENDERER_CLASSES = {
+    "stdlib": "rest_framework.renderers.JSONRenderer",
+    "fast": "library.renderers.FastJSONRenderer",
+}
+JSON_PARSER_CLASSES = {
+    "stdlib": "rest_framework.parsers.JSONParser",
+    "fast": "library.renderers.FastJSONParser",
+}
+
+# Token bucket budgets for library.throttling as "<requests>/<period>": a
+# bucket holds <requests> tokens and refills at that rate. Views with a
+# throttle_scope use "<scope>.user" and "<scope>.ip" budgets when set.
+# THROTTLING=False turns throttling off, e.g. for load tests; the test
+# runner turns it off too.
+THROTTLING = os.getenv("THROTTLING") != "False"
+THROTTLE_CLASSES = (
+    "library.throttling.UserTokenBucketThrottle",
+    "library.throttling.IPTokenBucketThrottle",
+)
+THROTTLE_RATES = {
+    "user": os.getenv("THROTTLE_USER_RATE", "1200/min"),
+    "ip": os.getenv("THROTTLE_IP_RATE", "3000/min"),
+    "token.ip": os.getenv("THROTTLE_TOKEN_IP_RATE", "30/min"),
+    "borrowings.create.user": os.getenv("THROTTLE_BORROW_USER_RATE", "60/min"),
+    "borrowings.create.ip": os.getenv("THROTTLE_BORROW_IP_RATE", "300/min"),
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        JWT_AUTHENTICATION_CLASSES[JWT_AUTH_MODE],
+    ),
+    "DEFAULT_RENDERER_CLASSES": (
+        JSON_RENDERER_CLASSES[JSON_BACKEND],
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ),
+    "DEFAULT_PARSER_CLASSES": (
+        JSON_PARSER_CLASSES[JSON_BACKEND],
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
+    "DEFAULT_THROTTLE_CLASSES": THROTTLE_CLASSES if THROTTLING else (),
+    "DEFAULT_THROTTLE_RATES": THROTTLE_RATES,
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_FILTER_BACKENDS": (
         "django_filters.rest_framework.DjangoFilterBackend",
     ),
 }
 
+TEST_RUNNER = "library.test_runner.TestRunner"
+
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Set DB_ENGINE=library.sqlite for the WAL / BEGIN IMMEDIATE SQLite profile.
+DB_ENGINE = os.getenv("DB_ENGINE", "django.db.backends.sqlite3")
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "ENGINE": DB_ENGINE,
+        "NAME": os.getenv("DB_NAME", BASE_DIR / "db.sqlite3"),
+        "USER": os.getenv("DB_USER", ""),
+        "PASSWORD": os.getenv("DB_PASSWORD", ""),
+        "HOST": os.getenv("DB_HOST", ""),
+        "PORT": os.getenv("DB_PORT", ""),
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Comma separated replica database files for sqlite, hosts otherwise.
+# Replicas share every other setting with the primary.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+    filter(None, os.getenv("DB_REPLICAS", "").split(",")), start=1
+):
+    alias = f"replica{index}"
+    location = "NAME" if "sqlite" in DB_ENGINE else "HOST"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        location: replica.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["library.db_routing.PrimaryReplicaRouter"]
+
+# How long a user's reads stay on the primary after one of their writes.
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 5))
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 300))
+
+# Queries slower than SLOW_QUERY_MS are sampled at SLOW_QUERY_SAMPLE_RATE into a
+# ring buffer of SLOW_QUERY_BUFFER_SIZE entries, with their EXPLAIN output.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", 1))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", 100))
+
+# Seconds an Idempotency-Key response is replayed for before it may be purged.
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+
+FINE_MULTIPLIER = Decimal(os.getenv("FINE_MULTIPLIER", "2"))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
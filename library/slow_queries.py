@@ -0,0 +1,100 @@
+import random
+import threading
+from collections import deque
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+MAX_PARAM_LENGTH = 200
+
+_samples = deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+_samples_lock = threading.Lock()
+
+
+def is_slow(elapsed):
+    return (
+        elapsed * 1000 >= settings.SLOW_QUERY_MS
+        and random.random() < settings.SLOW_QUERY_SAMPLE_RATE
+    )
+
+
+def record(connection, sql, params, many, elapsed, timings):
+    """Keep a slow query, where it came from and its plan in the ring buffer."""
+    request = timings.request
+    match = request.resolver_match
+    sample = {
+        "at": timezone.now().isoformat(),
+        "database": connection.alias,
+        "duration_ms": round(elapsed * 1000, 3),
+        "sql": sql,
+        "params": None if many else _clean_params(params),
+        "method": request.method,
+        "path": request.path,
+        "view": match.view_name if match else None,
+        "serializer": timings.serializing,
+        "plan": None if many else explain(connection, sql, params, timings),
+    }
+    with _samples_lock:
+        _samples.append(sample)
+
+
+def explain(connection, sql, params, timings):
+    """Return the plan of ``sql`` as a list of lines, or None if unavailable.
+
+    Inside a transaction it runs in a savepoint, so a failing EXPLAIN cannot
+    break the transaction the original query is part of.
+    """
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+
+    if connection.in_atomic_block:
+        savepoint = transaction.atomic(using=connection.alias)
+    else:
+        savepoint = nullcontext()
+
+    timings.explaining = True
+    try:
+        with savepoint:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"{connection.ops.explain_query_prefix()} {sql}", params
+                )
+                rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    finally:
+        timings.explaining = False
+
+    if connection.vendor in ("sqlite", "postgresql"):
+        return [str(row[-1]) for row in rows]
+    return [" | ".join(map(str, row)) for row in rows]
+
+
+def samples():
+    with _samples_lock:
+        return list(reversed(_samples))
+
+
+def clear():
+    with _samples_lock:
+        _samples.clear()
+
+
+def _clean_params(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {name: _clean_param(value) for name, value in params.items()}
+    return [_clean_param(value) for value in params]
+
+
+def _clean_param(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    value = str(value)
+    if len(value) > MAX_PARAM_LENGTH:
+        return value[:MAX_PARAM_LENGTH] + "..."
+    return value
@@ -0,0 +1,33 @@
+"""SQLite backend tuned for concurrent writers.
+
+Use it with ``"ENGINE": "library.sqlite"``. Every new connection gets the
+pragmas below, which a ``"PRAGMAS"`` dict in the database settings can
+override, and transactions start with BEGIN IMMEDIATE so writers queue
+on busy_timeout instead of failing with "database is locked" when a read
+lock cannot be upgraded.
+"""
+from django.db.backends.signals import connection_created
+from django.db.backends.sqlite3 import base
+from django.dispatch import receiver
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
+
+
+@receiver(connection_created, sender=DatabaseWrapper)
+def apply_pragmas(sender, connection, **kwargs):
+    pragmas = {**DEFAULT_PRAGMAS, **connection.settings_dict.get("PRAGMAS", {})}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
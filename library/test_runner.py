@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Run the tests with throttling off.
+
+    Every test client shares one address, so throttle buckets would fill
+    up across unrelated tests. Throttle tests turn it back on with
+    ``override_settings(THROTTLING=True)``.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._throttling = settings.THROTTLING
+        settings.THROTTLING = False
+
+    def teardown_test_environment(self, **kwargs):
+        settings.THROTTLING = self._throttling
+        super().teardown_test_environment(**kwargs)
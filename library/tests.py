@@ -0,0 +1,624 @@
+import datetime
+import io
+import os
+import tempfile
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+from drf_spectacular.generators import SchemaGenerator
+from rest_framework import serializers, status, viewsets
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from benchmarks.datagen import generate
+from benchmarks.load import percentile
+from books.models import Book
+from books.serializers import BookSerializer
+from borrowings.models import Borrowing
+from borrowings.serializers import BorrowingSerializer
+from library import slow_queries
+from library.cache import VersionedCacheMixin, invalidate
+from library.conditional import VersionETagMixin
+from library.metrics import Histogram
+from library.renderers import FastJSONParser, FastJSONRenderer
+from library.db_routing import (
+    PrimaryReplicaRouter,
+    ReplicaRoutingMixin,
+    _use_replicas,
+    pin_to_primary,
+    read_from_replicas,
+)
+from library.sqlite.base import DatabaseWrapper
+from library.throttling import (
+    IPTokenBucketThrottle,
+    UserTokenBucketThrottle,
+    parse_rate,
+)
+from library.values import ValuesSerializer
+from payment.models import Payment
+from payment.serializers import PaymentSerializer
+from users.models import User
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_go_to_the_primary_by_default(self):
+        self.assertEqual(self.router.db_for_read(User), "default")
+
+    def test_reads_go_to_replicas_when_requested(self):
+        with read_from_replicas():
+            self.assertEqual(self.router.db_for_read(User), "replica1")
+            self.assertEqual(self.router.db_for_write(User), "default")
+        self.assertEqual(self.router.db_for_read(User), "default")
+
+    def test_migrations_only_run_on_the_primary(self):
+        self.assertTrue(self.router.allow_migrate("default", "books"))
+        self.assertFalse(self.router.allow_migrate("replica1", "books"))
+
+
+class RoutedView(ReplicaRoutingMixin, APIView):
+    def get(self, request):
+        return Response({"replica": _use_replicas.get()})
+
+    def post(self, request):
+        return Response(status=status.HTTP_201_CREATED)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class ReplicaRoutingMixinTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="reader@mail.com", password="testpass")
+        self.factory = APIRequestFactory()
+
+    def call(self, method):
+        request = getattr(self.factory, method)("/")
+        force_authenticate(request, user=self.user)
+        return RoutedView.as_view()(request)
+
+    def test_safe_requests_read_from_replicas(self):
+        self.assertTrue(self.call("get").data["replica"])
+        self.assertFalse(_use_replicas.get())
+
+    def test_writes_pin_reads_to_the_primary(self):
+        self.call("post")
+        self.assertFalse(self.call("get").data["replica"])
+
+
+class LaggingReplicaList:
+    """Stands in for a replica that has not caught up with the primary yet."""
+
+    def list(self, request):
+        return Response({"rows": "stale" if _use_replicas.get() else "fresh"})
+
+
+class LaggingTaggedView(
+    VersionETagMixin, ReplicaRoutingMixin, LaggingReplicaList, viewsets.GenericViewSet
+):
+    etag_versions = ("lagging",)
+
+
+class LaggingCachedView(
+    VersionETagMixin,
+    VersionedCacheMixin,
+    ReplicaRoutingMixin,
+    LaggingReplicaList,
+    viewsets.GenericViewSet,
+):
+    etag_versions = ("lagging",)
+    cache_name = "lagging"
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class LaggingReplicaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email="reader@mail.com", password="testpass")
+        self.factory = APIRequestFactory()
+
+    def get(self, view):
+        request = self.factory.get("/")
+        force_authenticate(request, user=self.user)
+        return view.as_view({"get": "list"})(request)
+
+    def test_replica_reads_get_no_etag(self):
+        response = self.get(LaggingTaggedView)
+        self.assertEqual(response.data, {"rows": "stale"})
+        self.assertNotIn("ETag", response)
+
+        pin_to_primary(self.user)
+        response = self.get(LaggingTaggedView)
+        self.assertEqual(response.data, {"rows": "fresh"})
+        self.assertIn("ETag", response)
+
+    def test_cache_misses_are_read_from_the_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate("lagging")
+
+        for cache_status in ("MISS", "HIT"):
+            response = self.get(LaggingCachedView)
+            self.assertEqual(response["X-Cache"], cache_status)
+            self.assertEqual(response.data, {"rows": "fresh"})
+            self.assertIn("ETag", response)
+
+
+class TunedSQLiteBackendTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.connection = DatabaseWrapper(
+            {
+                "ENGINE": "library.sqlite",
+                "NAME": os.path.join(directory.name, "tuned.sqlite3"),
+                "PRAGMAS": {"busy_timeout": 1234},
+                "OPTIONS": {},
+                "TIME_ZONE": None,
+                "CONN_MAX_AGE": 0,
+                "CONN_HEALTH_CHECKS": False,
+                "AUTOCOMMIT": True,
+                "ATOMIC_REQUESTS": False,
+                "TEST": {},
+            },
+            alias="tuned",
+        )
+        self.addCleanup(self.connection.close)
+
+    def pragma(self, name):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_connections_get_tuned_pragmas(self):
+        self.assertEqual(self.pragma("journal_mode"), "wal")
+        self.assertEqual(self.pragma("synchronous"), 1)
+        self.assertEqual(self.pragma("busy_timeout"), 1234)
+
+    def test_transactions_begin_immediate(self):
+        executed = []
+        self.connection.ensure_connection()
+        self.connection.execute_wrappers.append(
+            lambda execute, sql, *args: executed.append(sql) or execute(sql, *args)
+        )
+        self.connection._start_transaction_under_autocommit()
+        self.assertTrue(self.connection.connection.in_transaction)
+        self.connection.connection.rollback()
+        self.assertEqual(executed, ["BEGIN IMMEDIATE"])
+
+
+class BenchmarkDatasetTest(TestCase):
+    def test_generate_is_deterministic(self):
+        summary = generate(
+            books=20, users=5, borrowings=50, payments=5, seed=1,
+            batch_size=7, log=lambda message: None,
+        )
+
+        self.assertEqual(
+            summary,
+            {"seed": 1, "users": 6, "books": 20, "borrowings": 50, "payments": 5},
+        )
+        self.assertTrue(User.objects.get(email="admin@bench.example").is_staff)
+        self.assertTrue(
+            User.objects.get(email="user0@bench.example").check_password(
+                "benchmark"
+            )
+        )
+        rows = list(Borrowing.objects.order_by("id").values_list(
+            "book__title", "user__email", "borrow_date", "actual_return_date"
+        ))
+
+        Borrowing.objects.all().delete()
+        Book.objects.all().delete()
+        User.objects.all().delete()
+        generate(
+            books=20, users=5, borrowings=50, payments=5, seed=1,
+            batch_size=50, log=lambda message: None,
+        )
+        self.assertEqual(
+            list(Borrowing.objects.order_by("id").values_list(
+                "book__title", "user__email", "borrow_date", "actual_return_date"
+            )),
+            rows,
+        )
+
+    def test_percentile_uses_nearest_rank(self):
+        latencies = list(range(1, 101))
+        self.assertEqual(percentile(latencies, 0.50), 50)
+        self.assertEqual(percentile(latencies, 0.99), 99)
+        self.assertEqual(percentile([3], 0.95), 3)
+        self.assertIsNone(percentile([], 0.5))
+
+
+class RequestMetricsTest(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Dune", author="Herbert", cover="HR", inventory=1, daily_fee=1
+        )
+
+    def timings(self, response):
+        return dict(
+            part.strip().split(";", 1)
+            for part in response["Server-Timing"].split(",")
+        )
+
+    def test_server_timing_splits_request_time(self):
+        response = self.client.get(f"/api/books/{self.book.id}/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {"db", "serialize", "render", "total"})
+        self.assertIn('desc="1 queries"', timings["db"])
+        for name in ("serialize", "render", "total"):
+            self.assertGreater(float(timings[name].split("=")[1]), 0)
+
+    def test_metrics_are_served_to_internal_ips(self):
+        self.client.get("/api/books/")
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn(
+            'http_requests_total{view="books:book-list",method="GET",status="200"}',
+            body,
+        )
+        self.assertIn(
+            'http_request_db_queries_bucket{view="books:book-list",method="GET",'
+            'le="+Inf"}',
+            body,
+        )
+
+    def test_metrics_are_hidden_from_other_addresses(self):
+        response = self.client.get("/metrics", REMOTE_ADDR="203.0.113.9")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class HistogramTest(SimpleTestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram("latency_seconds", "Latency.", (0.1, 1))
+        for value in (0.05, 0.5, 0.7, 3):
+            histogram.observe((("view", "a"),), value)
+
+        self.assertEqual(
+            list(histogram.expose())[2:],
+            [
+                'latency_seconds_bucket{view="a",le="0.1"} 1',
+                'latency_seconds_bucket{view="a",le="1"} 3',
+                'latency_seconds_bucket{view="a",le="+Inf"} 4',
+                'latency_seconds_sum{view="a"} 4.25',
+                'latency_seconds_count{view="a"} 4',
+            ],
+        )
+
+
+class SlowQuerySamplerTest(TestCase):
+    def setUp(self):
+        slow_queries.clear()
+        self.addCleanup(slow_queries.clear)
+        self.admin = User.objects.create_user(
+            email="admin@library.com", password="password", is_staff=True
+        )
+        self.book = Book.objects.create(
+            title="Dune", author="Herbert", cover="HR", inventory=1, daily_fee=1
+        )
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_sampled_with_their_plan(self):
+        response = self.client.get(f"/api/books/{self.book.id}/")
+
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+        [sample] = slow_queries.samples()
+        self.assertEqual(sample["view"], "books:book-detail")
+        self.assertEqual(sample["path"], f"/api/books/{self.book.id}/")
+        self.assertIn('"books_book"', sample["sql"])
+        self.assertEqual(sample["params"], [self.book.id])
+        self.assertTrue(sample["plan"])
+
+    def test_fast_queries_are_not_sampled(self):
+        self.client.get(f"/api/books/{self.book.id}/")
+
+        self.assertEqual(slow_queries.samples(), [])
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_samples_are_listed_for_staff_only(self):
+        self.client.get("/api/books/")
+        api = APIClient()
+
+        response = api.get("/api/slow-queries/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        api.force_authenticate(self.admin)
+        response = api.get("/api/slow-queries/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[-1]["view"], "books:book-list")
+
+        response = api.delete("/api/slow-queries/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(slow_queries.samples(), [])
+
+    def test_samples_are_in_the_schema(self):
+        schema = SchemaGenerator().get_schema(request=None, public=True)
+        self.assertIn("get", schema["paths"]["/api/slow-queries/"])
+        self.assertIn("SlowQuerySample", schema["components"]["schemas"])
+
+
+class ValuesSerializerTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email="reader@library.com", password="x")
+        book = Book.objects.create(
+            title="Dune", author="Herbert", cover="HR", inventory=3,
+            daily_fee=Decimal("1.5"),
+        )
+        Book.objects.create(
+            title="Emma", author="Austen", cover="ST", inventory=0,
+            daily_fee=Decimal("0.25"),
+        )
+        borrowing = Borrowing.objects.create(
+            book=book, user=user, expected_return_date=datetime.date(2024, 2, 1)
+        )
+        Borrowing.objects.create(
+            book=book,
+            user=user,
+            expected_return_date=datetime.date(2024, 2, 1),
+            actual_return_date=datetime.date(2024, 1, 20),
+        )
+        Payment.objects.create(
+            status="PN", type="FN", borrowing=borrowing, user=user,
+            money_to_pay=Decimal("12.5"),
+        )
+        Payment.objects.create(status="PD", type="PN")
+
+    def assertRendersLike(self, serializer_class, queryset):
+        values_serializer = ValuesSerializer.for_serializer(serializer_class)
+        rows = list(values_serializer.values(queryset))
+        renderer = JSONRenderer()
+
+        self.assertEqual(
+            renderer.render(values_serializer.to_representation(rows)),
+            renderer.render(serializer_class(queryset, many=True).data),
+        )
+
+    def test_output_matches_model_serializers(self):
+        self.assertRendersLike(BookSerializer, Book.objects.order_by("id"))
+        self.assertRendersLike(BorrowingSerializer, Borrowing.objects.order_by("id"))
+        self.assertRendersLike(PaymentSerializer, Payment.objects.order_by("id"))
+
+    def test_endpoints_match_model_serializers(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.get())
+        renderer = JSONRenderer()
+        book = Book.objects.first()
+
+        response = client.get("/api/books/")
+        self.assertEqual(
+            renderer.render(response.data["results"]),
+            renderer.render(
+                BookSerializer(Book.objects.order_by("id"), many=True).data
+            ),
+        )
+        response = client.get(f"/api/books/{book.id}/")
+        self.assertEqual(
+            response.content, renderer.render(BookSerializer(book).data)
+        )
+        response = client.get("/api/payments/")
+        self.assertEqual(
+            response.content,
+            renderer.render(
+                PaymentSerializer(Payment.objects.all(), many=True).data
+            ),
+        )
+
+    def test_missing_rows_are_404(self):
+        response = APIClient().get("/api/books/0/")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_computed_fields_are_rejected(self):
+        class TitleSerializer(serializers.ModelSerializer):
+            shouting = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Book
+                fields = ("id", "shouting")
+
+            def get_shouting(self, book):
+                return book.title.upper()
+
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(TitleSerializer)
+
+
+class FastJSONContractTest(SimpleTestCase):
+    payloads = [
+        None,
+        [],
+        {},
+        {"id": 1, "title": "Dune", "available": True, "cover": None},
+        {"daily_fee": Decimal("1.50"), "fine": Decimal("0.1")},
+        {
+            "borrow_date": datetime.date(2024, 1, 31),
+            "at": datetime.datetime(
+                2024, 1, 31, 8, 5, 3, 123456, tzinfo=datetime.timezone.utc
+            ),
+            "naive": datetime.datetime(2024, 1, 31, 8, 5),
+            "time": datetime.time(8, 5, 3, 500),
+            "late_by": datetime.timedelta(days=2, seconds=30),
+        },
+        {"ref": uuid.UUID("12345678-1234-5678-1234-567812345678")},
+        {"text": "Straße \u2028 \u2029 \"quoted\" \\ \n\t\x01 \x7f"},
+        {"emoji": "\U0001F4DA", "cyrillic": "Кобзар"},
+        {1: "int key", None: "null key", True: "bool key"},
+        {"nested": [{"tuple": (1, 2)}, {"set": [3]}], "blob": b"bytes"},
+        {"ints": [0, -1, 2 ** 63 - 1, -(2 ** 63), 2 ** 64]},
+        {"floats": [0.5, 1.25, -3.0, 0.1 + 0.2]},
+        serializers.ReturnDict({"a": 1}, serializer=None),
+        serializers.ReturnList([1, 2], serializer=None),
+    ]
+
+    def test_renders_like_json_renderer(self):
+        fast = FastJSONRenderer()
+        stdlib = JSONRenderer()
+
+        for payload in self.payloads:
+            with self.subTest(payload=payload):
+                self.assertEqual(fast.render(payload), stdlib.render(payload))
+
+    def test_indented_output_uses_json_renderer(self):
+        payload = {"a": [1, {"b": Decimal("2.00")}]}
+
+        self.assertEqual(
+            FastJSONRenderer().render(payload, "application/json; indent=2"),
+            JSONRenderer().render(payload, "application/json; indent=2"),
+        )
+        self.assertEqual(
+            FastJSONRenderer().render(payload, renderer_context={"indent": 4}),
+            JSONRenderer().render(payload, renderer_context={"indent": 4}),
+        )
+
+    def test_parses_like_json_parser(self):
+        bodies = [
+            b'{"book": 1, "books": [1, 2], "expected_return_date": "2024-02-01"}',
+            b'{"fee": 1.5, "big": 123456789012345678901234567890}',
+            '{"title": "Кобзар \u2028"}'.encode(),
+            b'"\\ud800"',
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertEqual(
+                    FastJSONParser().parse(io.BytesIO(body)),
+                    JSONParser().parse(io.BytesIO(body)),
+                )
+
+    def test_invalid_bodies_raise_parse_errors(self):
+        for body in (b"{", b'{"fee": NaN}', b"\xef\xbb\xbf{}"):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    JSONParser().parse(io.BytesIO(body))
+                with self.assertRaises(ParseError) as raised:
+                    FastJSONParser().parse(io.BytesIO(body))
+                self.assertEqual(
+                    str(raised.exception), str(expected.exception)
+                )
+
+    def test_falls_back_without_orjson(self):
+        payload = {"daily_fee": Decimal("1.50"), "day": datetime.date(2024, 1, 1)}
+
+        with mock.patch("library.renderers.orjson", None):
+            self.assertEqual(
+                FastJSONRenderer().render(payload), JSONRenderer().render(payload)
+            )
+            self.assertEqual(
+                FastJSONParser().parse(io.BytesIO(b'{"a": [1]}')), {"a": [1]}
+            )
+
+
+class ThrottledView(APIView):
+    throttle_scope = "login"
+
+    def get(self, request):
+        return Response()
+
+
+@override_settings(
+    THROTTLING=True,
+    REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"user": "2/s", "ip": "100/s", "login.ip": "3/m"},
+    }
+)
+class TokenBucketThrottleTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 1_000_000.0
+        self.view = ThrottledView()
+        self.request = APIRequestFactory().get("/", REMOTE_ADDR="10.0.0.1")
+        self.request.user = mock.Mock(is_authenticated=True, pk=7)
+        self.throttle = IPTokenBucketThrottle()
+        self.throttle.timer = lambda: self.now
+
+    def allowed(self, throttle=None, view=None):
+        throttle = throttle or self.throttle
+        return throttle.allow_request(self.request, view or self.view)
+
+    def test_burst_then_refill(self):
+        self.assertEqual([self.allowed() for _ in range(4)], [True] * 3 + [False])
+        self.assertAlmostEqual(self.throttle.wait(), 20)
+
+        self.now += 19
+        self.assertFalse(self.allowed())
+        self.now += 1
+        self.assertTrue(self.allowed())
+        self.assertFalse(self.allowed())
+
+    def test_idle_bucket_holds_at_most_its_capacity(self):
+        self.allowed()
+        self.now += 3600
+        self.assertEqual([self.allowed() for _ in range(4)], [True] * 3 + [False])
+
+    def test_buckets_are_per_address_and_scope(self):
+        for _ in range(3):
+            self.allowed()
+        self.assertTrue(self.allowed(view=APIView()))
+
+        self.request.META["REMOTE_ADDR"] = "10.0.0.2"
+        self.assertTrue(self.allowed())
+
+    def test_user_bucket_falls_back_to_the_default_budget(self):
+        throttle = UserTokenBucketThrottle()
+        throttle.timer = lambda: self.now
+        self.assertEqual(
+            [self.allowed(throttle) for _ in range(3)], [True, True, False]
+        )
+        self.now += 0.5
+        self.assertTrue(self.allowed(throttle))
+
+        self.request.user = mock.Mock(is_authenticated=False)
+        self.assertTrue(all(self.allowed(throttle) for _ in range(5)))
+
+    def test_everything_passes_with_throttling_off(self):
+        with self.settings(THROTTLING=False):
+            self.assertTrue(all(self.allowed() for _ in range(5)))
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ImproperlyConfigured):
+            parse_rate("10/fortnight")
+
+
+@override_settings(
+    THROTTLING=True,
+    REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_CLASSES": settings.THROTTLE_CLASSES,
+        "DEFAULT_THROTTLE_RATES": {**settings.THROTTLE_RATES, "token.ip": "3/h"},
+    }
+)
+class TokenEndpointThrottleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_token_endpoint_is_limited_per_address(self):
+        client = APIClient()
+        data = {"email": "nobody@example.com", "password": "wrong"}
+        for _ in range(3):
+            response = client.post("/api/user/token/", data)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = client.post("/api/user/token/", data)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
@@ -0,0 +1,118 @@
+import functools
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Bucket levels are kept in thousandths of a token so the cache only has to
+# increment integers.
+SCALE = 1000
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+# Idle buckets expire this many full refills after they were created.
+TIMEOUT_REFILLS = 10
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """Return ``(capacity, tokens per second)`` for a ``"<requests>/<period>"`` rate."""
+    try:
+        requests, period = rate.split("/")
+        capacity = int(requests)
+        duration = PERIODS[period[0]]
+    except (KeyError, IndexError, ValueError):
+        raise ImproperlyConfigured(f"Invalid throttle rate {rate!r}.")
+    return capacity, capacity / duration
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Token bucket rate limit kept in the shared cache.
+
+    A bucket holds ``capacity`` tokens and refills at ``capacity`` per
+    period of its rate. Instead of storing tokens and a timestamp, the cache
+    holds a single level: ``refill rate * time of the last full bucket +
+    tokens taken since``. A request adds one token to the level with an
+    atomic ``incr`` and is allowed while the level stays within
+    ``capacity`` of the current time's level. Limits therefore hold across
+    worker processes and an allowed request costs one cache round trip.
+
+    ``kind`` picks the bucket key, and the budget comes from
+    DEFAULT_THROTTLE_RATES under ``"<throttle_scope>.<kind>"`` when the view
+    sets a ``throttle_scope`` that has one, else under ``kind``. Every
+    request is allowed while the THROTTLING setting is off.
+    """
+
+    kind = None
+    timer = time.time
+
+    def get_cache_ident(self, request):
+        raise NotImplementedError
+
+    def get_bucket(self, view):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        scope = getattr(view, "throttle_scope", None)
+        if scope and f"{scope}.{self.kind}" in rates:
+            return f"{scope}.{self.kind}", rates[f"{scope}.{self.kind}"]
+        return self.kind, rates.get(self.kind)
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        if not settings.THROTTLING:
+            return True
+        bucket, rate = self.get_bucket(view)
+        ident = self.get_cache_ident(request)
+        if rate is None or ident is None:
+            return True
+
+        capacity, refill = parse_rate(rate)
+        key = f"throttle:{bucket}:{ident}"
+        now = int(self.timer() * refill * SCALE)
+        level = self.take(key, now, math.ceil(capacity / refill) * TIMEOUT_REFILLS)
+
+        excess = level - now - capacity * SCALE
+        if excess <= 0:
+            return True
+        cache.decr(key, SCALE)
+        self.retry_after = excess / (refill * SCALE)
+        return False
+
+    def take(self, key, now, timeout):
+        """Add one token to the bucket at ``key`` and return its new level."""
+        try:
+            level = cache.incr(key, SCALE)
+        except ValueError:
+            if cache.add(key, now + SCALE, timeout):
+                return now + SCALE
+            level = cache.incr(key, SCALE)
+
+        # A level behind the current time means the bucket is full; catch it
+        # up. Racing requests may both catch up, which only takes tokens away.
+        if level < now + SCALE:
+            level = cache.incr(key, now + SCALE - level)
+        return level
+
+    def wait(self):
+        return self.retry_after
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Token bucket per authenticated user; anonymous requests pass."""
+
+    kind = "user"
+
+    def get_cache_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Token bucket per client address, see NUM_PROXIES."""
+
+    kind = "ip"
+
+    def get_cache_ident(self, request):
+        return self.get_ident(request)
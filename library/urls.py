@@ -17,6 +17,8 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from library.views import SlowQueryView, metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("books.urls", namespace="books")),
@@ -26,6 +28,8 @@ urlpatterns = [
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/doc/swagger/", SpectacularSwaggerView.as_view(), name="swagger-ui"),
     path("api/doc/redoc/", SpectacularRedocView.as_view(), name="redoc"),
+    path("api/slow-queries/", SlowQueryView.as_view(), name="slow-queries"),
+    path("metrics", metrics, name="metrics"),
 ]
 
 
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from drf_spectacular.utils import extend_schema, inline_serializer
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from library import slow_queries
+from library.metrics import registry
+
+
+def metrics(request):
+    """Prometheus scrape endpoint, only answered for ``INTERNAL_IPS``."""
+    if request.META.get("REMOTE_ADDR") not in settings.INTERNAL_IPS:
+        raise Http404
+    return HttpResponse(
+        registry.expose(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+slow_query_samples = inline_serializer(
+    "SlowQuerySample",
+    many=True,
+    fields={
+        "at": serializers.DateTimeField(),
+        "database": serializers.CharField(),
+        "duration_ms": serializers.FloatField(),
+        "sql": serializers.CharField(),
+        "params": serializers.JSONField(allow_null=True),
+        "method": serializers.CharField(),
+        "path": serializers.CharField(),
+        "view": serializers.CharField(allow_null=True),
+        "serializer": serializers.CharField(allow_null=True),
+        "plan": serializers.ListField(child=serializers.CharField(), allow_null=True),
+    },
+)
+
+
+class SlowQueryView(APIView):
+    """Sampled slow queries of this process, newest first."""
+
+    permission_classes = (IsAdminUser,)
+
+    @extend_schema(responses=slow_query_samples)
+    def get(self, request, *args, **kwargs):
+        return Response(slow_queries.samples())
+
+    @extend_schema(responses={status.HTTP_204_NO_CONTENT: None})
+    def delete(self, request, *args, **kwargs):
+        slow_queries.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
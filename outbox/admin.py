@@ -0,0 +1,6 @@
+from django.contrib import admin
+from outbox.models import OutboxCursor, OutboxEvent
+
+
+admin.site.register(OutboxEvent)
+admin.site.register(OutboxCursor)
@@ -0,0 +1,127 @@
+import json
+import os
+import time
+import urllib.request
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from outbox.models import OutboxCursor, OutboxEvent
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_GAP_TIMEOUT = 30
+
+
+class FileSink:
+    """Append each event to ``path`` as a line of JSON."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, messages):
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.writelines(
+                json.dumps(message, cls=DjangoJSONEncoder) + "\n"
+                for message in messages
+            )
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class HTTPSink:
+    """POST each batch to ``url`` as a JSON array; an error status fails it."""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, messages):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(messages, cls=DjangoJSONEncoder).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class DeliveryFailed(Exception):
+    """The sink rejected a batch after ``sent`` events were delivered."""
+
+    def __init__(self, sent, error):
+        super().__init__(f"{error} (after {sent} events were dispatched)")
+        self.sent = sent
+        self.error = error
+
+
+def committed_prefix(events, position, now, gap_timeout=DEFAULT_GAP_TIMEOUT):
+    """Return ``events`` up to the first id gap a running transaction may fill.
+
+    Ids are handed out before commit, so a missing id can still show up
+    after higher ones. A gap is only skipped once the event after it is
+    ``gap_timeout`` seconds old; the missing event is then taken to be
+    rolled back.
+    """
+    settled = now - timedelta(seconds=gap_timeout)
+    expected = position + 1
+    for index, event in enumerate(events):
+        if event.pk != expected and event.created_at > settled:
+            return events[:index]
+        expected = event.pk + 1
+    return events
+
+
+def dispatch_batch(
+    sink, consumer, batch_size=DEFAULT_BATCH_SIZE, gap_timeout=DEFAULT_GAP_TIMEOUT
+):
+    """Send the next batch of ``consumer``'s events and return how many.
+
+    The sink runs outside any transaction, so a slow delivery never holds
+    database locks. The cursor only moves once the sink accepted the batch,
+    so delivery is at least once: consumers should skip event ids they have
+    already seen. The cursor is moved with a conditional UPDATE, so when two
+    dispatchers of one consumer send the same batch it never goes backwards.
+    """
+    cursor, _ = OutboxCursor.objects.get_or_create(consumer=consumer)
+    events = list(
+        OutboxEvent.objects.filter(pk__gt=cursor.position).order_by("pk")[
+            :batch_size
+        ]
+    )
+    events = committed_prefix(events, cursor.position, timezone.now(), gap_timeout)
+    if not events:
+        return 0
+
+    sink.send([event.as_message() for event in events])
+    OutboxCursor.objects.filter(pk=cursor.pk, position=cursor.position).update(
+        position=events[-1].pk, updated_at=timezone.now()
+    )
+    return len(events)
+
+
+def dispatch(
+    sink,
+    consumer,
+    batch_size=DEFAULT_BATCH_SIZE,
+    gap_timeout=DEFAULT_GAP_TIMEOUT,
+    poll_interval=None,
+):
+    """Dispatch until no events are left, or forever every ``poll_interval`` seconds.
+
+    Raises DeliveryFailed with the number of events already delivered when
+    the sink fails.
+    """
+    sent = 0
+    while True:
+        try:
+            count = dispatch_batch(sink, consumer, batch_size, gap_timeout)
+        except OSError as error:
+            raise DeliveryFailed(sent, error) from error
+        sent += count
+        if count:
+            continue
+        if poll_interval is None:
+            return sent
+        time.sleep(poll_interval)
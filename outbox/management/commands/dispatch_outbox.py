@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from outbox.dispatch import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_GAP_TIMEOUT,
+    DeliveryFailed,
+    FileSink,
+    HTTPSink,
+    dispatch,
+)
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox events in id order to a file or an HTTP endpoint."
+
+    def add_arguments(self, parser):
+        sink = parser.add_mutually_exclusive_group(required=True)
+        sink.add_argument("--file", help="Append events as JSON lines to this file.")
+        sink.add_argument("--url", help="POST batches of events to this URL.")
+        parser.add_argument(
+            "--consumer",
+            default="default",
+            help="Name under which the delivered position is kept.",
+        )
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument(
+            "--gap-timeout",
+            type=int,
+            default=DEFAULT_GAP_TIMEOUT,
+            help="Seconds to wait for a missing event id before skipping it.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            help="Keep polling at this interval instead of exiting when done.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        if options["file"]:
+            sink = FileSink(options["file"])
+        else:
+            sink = HTTPSink(options["url"])
+        try:
+            sent = dispatch(
+                sink,
+                options["consumer"],
+                options["batch_size"],
+                options["gap_timeout"],
+                options["poll_interval"],
+            )
+        except KeyboardInterrupt:
+            return
+        except DeliveryFailed as failure:
+            raise CommandError(
+                f"Delivery failed after {failure.sent} events were dispatched "
+                f"to {options['consumer']}: {failure.error}"
+            )
+        self.stdout.write(f"Dispatched {sent} events to {options['consumer']}.")
@@ -0,0 +1,45 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class OutboxEventQuerySet(models.QuerySet):
+    def record(self, topic, payload):
+        """Add an event; call it in the transaction that makes the change."""
+        return self.create(topic=topic, payload=payload)
+
+    def record_many(self, topic, payloads):
+        return self.bulk_create(
+            [self.model(topic=topic, payload=payload) for payload in payloads]
+        )
+
+
+class OutboxEvent(models.Model):
+    """A domain change, saved with the change itself and dispatched in id order."""
+
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = OutboxEventQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.id} {self.topic}"
+
+    def as_message(self):
+        return {
+            "id": self.id,
+            "topic": self.topic,
+            "created_at": self.created_at,
+            "payload": self.payload,
+        }
+
+
+class OutboxCursor(models.Model):
+    """Id of the last event a consumer has received."""
+
+    consumer = models.CharField(max_length=100, unique=True)
+    position = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.consumer} at {self.position}"
@@ -0,0 +1,275 @@
+import datetime
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from books.models import Book
+from borrowings.models import Borrowing
+from outbox.dispatch import (
+    DeliveryFailed,
+    committed_prefix,
+    dispatch,
+    dispatch_batch,
+)
+from outbox.models import OutboxCursor, OutboxEvent
+from payment.fines import generate_overdue_fines
+from payment.models import Payment
+from users.models import User
+
+
+class DomainEventTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="pass"
+        )
+        self.admin = User.objects.create_superuser(
+            email="admin@example.com", password="pass"
+        )
+        self.book = Book.objects.create(
+            title="Book", author="Author", cover="HR", inventory=1, daily_fee=1
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def events(self):
+        return list(OutboxEvent.objects.order_by("id").values_list("topic", "payload"))
+
+    def borrow(self):
+        return self.client.post(
+            "/api/borrowings/create/",
+            {
+                "book": self.book.id,
+                "user": self.user.id,
+                "expected_return_date": "2030-01-01",
+            },
+        )
+
+    def test_borrowing_created_and_returned(self):
+        self.assertEqual(self.borrow().status_code, status.HTTP_201_CREATED)
+        borrowing = Borrowing.objects.get()
+        self.client.post(f"/api/borrowings/{borrowing.id}/return/")
+
+        today = str(timezone.localdate())
+        self.assertEqual(
+            self.events(),
+            [
+                (
+                    "borrowing.created",
+                    {
+                        "id": borrowing.id,
+                        "book": self.book.id,
+                        "user": self.user.id,
+                        "borrow_date": today,
+                        "expected_return_date": "2030-01-01",
+                    },
+                ),
+                (
+                    "borrowing.returned",
+                    {
+                        "id": borrowing.id,
+                        "book": self.book.id,
+                        "user": self.user.id,
+                        "expected_return_date": "2030-01-01",
+                        "actual_return_date": today,
+                    },
+                ),
+            ],
+        )
+
+    def test_no_event_when_the_change_fails(self):
+        self.book.inventory = 0
+        self.book.save()
+        self.assertEqual(self.borrow().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.events(), [])
+
+    def test_payment_status_changes(self):
+        self.client.force_authenticate(user=self.admin)
+        payment_id = self.client.post(
+            "/api/payments/", {"status": "PN", "type": "PN"}
+        ).data["id"]
+        self.client.patch(f"/api/payments/{payment_id}/", {"money_to_pay": "5.00"})
+        self.client.patch(f"/api/payments/{payment_id}/", {"status": "PD"})
+
+        self.assertEqual(
+            [
+                (topic, payload["previous_status"], payload["status"])
+                for topic, payload in self.events()
+            ],
+            [
+                ("payment.status_changed", None, "PN"),
+                ("payment.status_changed", "PN", "PD"),
+            ],
+        )
+        self.assertEqual(self.events()[-1][1]["money_to_pay"], "5.00")
+
+    def test_generated_fines(self):
+        borrowing = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=datetime.date(2023, 2, 1),
+        )
+        OutboxEvent.objects.all().delete()
+
+        generate_overdue_fines(datetime.date(2023, 3, 1))
+        fine = Payment.objects.get()
+        [(topic, payload)] = self.events()
+        self.assertEqual(topic, "payment.status_changed")
+        self.assertEqual(
+            (payload["id"], payload["borrowing"], payload["type"], payload["status"]),
+            (fine.id, borrowing.id, "FN", "PN"),
+        )
+
+    def test_existing_fines_get_no_new_event(self):
+        fined, unfined = [
+            Borrowing.objects.create(
+                book=self.book,
+                user=self.user,
+                expected_return_date=datetime.date(2023, 2, 1),
+            )
+            for _ in range(2)
+        ]
+        Payment.objects.create(
+            borrowing=fined,
+            user=self.user,
+            type=Payment.Type.FINE,
+            status=Payment.Status.PENDING,
+        )
+        OutboxEvent.objects.all().delete()
+
+        generate_overdue_fines(datetime.date(2023, 3, 1))
+        generate_overdue_fines(datetime.date(2023, 3, 2))
+        new_fine = Payment.objects.get(borrowing=unfined)
+        self.assertEqual(
+            [(payload["id"], payload["borrowing"]) for _, payload in self.events()],
+            [(new_fine.id, unfined.id)],
+        )
+
+
+class RecordingSink:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def send(self, messages):
+        if self.fail:
+            raise OSError("unreachable")
+        self.batches.append([message["id"] for message in messages])
+
+
+class DispatchTest(TestCase):
+    def setUp(self):
+        OutboxEvent.objects.record_many("test.event", [{"n": n} for n in range(5)])
+        self.ids = list(OutboxEvent.objects.order_by("id").values_list("id", flat=True))
+
+    def test_batches_in_id_order_and_resumes_from_the_cursor(self):
+        sink = RecordingSink()
+        self.assertEqual(dispatch(sink, "analytics", batch_size=2), 5)
+        self.assertEqual(sink.batches, [self.ids[:2], self.ids[2:4], self.ids[4:]])
+        self.assertEqual(OutboxCursor.objects.get().position, self.ids[-1])
+
+        event = OutboxEvent.objects.record("test.event", {"n": 5})
+        self.assertEqual(dispatch(sink, "analytics", batch_size=2), 1)
+        self.assertEqual(sink.batches[-1], [event.id])
+
+    def test_consumers_have_their_own_position(self):
+        dispatch(RecordingSink(), "analytics")
+        notifications = RecordingSink()
+        self.assertEqual(dispatch(notifications, "notifications"), 5)
+        self.assertEqual(notifications.batches, [self.ids])
+
+    def test_failed_delivery_keeps_the_position(self):
+        with self.assertRaises(DeliveryFailed) as failure:
+            dispatch(RecordingSink(fail=True), "analytics")
+        self.assertEqual(failure.exception.sent, 0)
+        self.assertEqual(dispatch(RecordingSink(), "analytics"), 5)
+
+    def test_cursor_does_not_move_back(self):
+        class RacingSink(RecordingSink):
+            def send(self, messages):
+                super().send(messages)
+                OutboxCursor.objects.update(position=ids[-1])
+
+        ids = self.ids
+        self.assertEqual(dispatch_batch(RacingSink(), "analytics", batch_size=2), 2)
+        self.assertEqual(OutboxCursor.objects.get().position, ids[-1])
+
+    def test_waits_for_a_recent_gap(self):
+        events = list(OutboxEvent.objects.order_by("id"))
+        del events[2]
+        now = timezone.now()
+
+        self.assertEqual(committed_prefix(events, 0, now), events[:2])
+        later = now + datetime.timedelta(seconds=31)
+        self.assertEqual(committed_prefix(events, 0, later), events)
+
+    def test_file_sink(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "events.ndjson")
+            out = StringIO()
+            call_command(
+                "dispatch_outbox", "--file", path, "--batch-size", "3", stdout=out
+            )
+            with open(path) as file:
+                lines = [json.loads(line) for line in file]
+
+        self.assertIn("Dispatched 5 events to default.", out.getvalue())
+        self.assertEqual([line["id"] for line in lines], self.ids)
+        self.assertEqual(lines[0]["topic"], "test.event")
+        self.assertEqual(lines[0]["payload"], {"n": 0})
+
+    def test_http_sink(self):
+        received = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                received.append(json.loads(body))
+                self.send_response(204 if len(received) == 1 else 500)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/events"
+        try:
+            with self.assertRaisesMessage(
+                CommandError, "Delivery failed after 4 events were dispatched"
+            ):
+                call_command(
+                    "dispatch_outbox", "--url", url, "--batch-size", "4",
+                    stdout=StringIO(),
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(
+            [[event["id"] for event in batch] for batch in received],
+            [self.ids[:4], self.ids[4:]],
+        )
+        self.assertEqual(OutboxCursor.objects.get().position, self.ids[3])
+
+
+class DispatchTransactionTest(TransactionTestCase):
+    def test_sink_runs_outside_a_transaction(self):
+        OutboxEvent.objects.record("test.event", {})
+        in_transaction = []
+
+        class Sink:
+            def send(self, messages):
+                in_transaction.append(connection.in_atomic_block)
+
+        self.assertEqual(dispatch(Sink(), "analytics"), 1)
+        self.assertEqual(in_transaction, [False])
@@ -0,0 +1,19 @@
+from outbox.models import OutboxEvent
+
+
+def record_status_changes(payments, previous_status=None):
+    OutboxEvent.objects.record_many(
+        "payment.status_changed",
+        [
+            {
+                "id": payment.pk,
+                "borrowing": payment.borrowing_id,
+                "user": payment.user_id,
+                "type": payment.type,
+                "previous_status": previous_status,
+                "status": payment.status,
+                "money_to_pay": payment.money_to_pay,
+            }
+            for payment in payments
+        ],
+    )
@@ -0,0 +1,170 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (
+    DateField,
+    DecimalField,
+    F,
+    Func,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce, Greatest, Round
+from django.utils import timezone
+
+from borrowings.models import Borrowing
+from payment.events import record_status_changes
+from payment.models import Payment
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class DaysBetween(Func):
+    """Whole days from the second date expression to the first one."""
+
+    arity = 2
+    template = "(%(expressions)s)"
+    arg_joiner = " - "
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="DATEDIFF(%(expressions)s)",
+            arg_joiner=", ",
+            **extra_context,
+        )
+
+
+def fine_amount(as_of=None, multiplier=None):
+    """Expression for ``days_overdue * book.daily_fee * multiplier`` of a borrowing.
+
+    Open borrowings are counted up to ``as_of``, returned ones up to their
+    actual return date.
+    """
+    as_of = as_of or timezone.localdate()
+    if multiplier is None:
+        multiplier = settings.FINE_MULTIPLIER
+
+    end = Coalesce("actual_return_date", Value(as_of, output_field=DateField()))
+    days_overdue = Greatest(DaysBetween(end, "expected_return_date"), Value(0))
+    return Round(
+        days_overdue * F("book__daily_fee") * Value(multiplier),
+        2,
+        output_field=DecimalField(max_digits=8, decimal_places=2),
+    )
+
+
+def annotate_fines(borrowings, as_of=None, multiplier=None):
+    return borrowings.annotate(fine_amount=fine_amount(as_of, multiplier))
+
+
+def recalculate_fines(borrowings=None, as_of=None, multiplier=None):
+    """Recompute every pending fine of ``borrowings`` in a single UPDATE."""
+    amounts = annotate_fines(
+        Borrowing.objects.filter(pk=OuterRef("borrowing_id")), as_of, multiplier
+    ).values("fine_amount")
+
+    fines = Payment.objects.filter(
+        type=Payment.Type.FINE, status=Payment.Status.PENDING
+    )
+    if borrowings is not None:
+        fines = fines.filter(borrowing__in=borrowings)
+    return fines.update(money_to_pay=Subquery(amounts))
+
+
+def overdue_borrowings(today):
+    return Borrowing.objects.filter(
+        actual_return_date__isnull=True, expected_return_date__lt=today
+    )
+
+
+def iter_overdue_chunks(today, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (id, user_id, fine_amount) of overdue borrowings in key order.
+
+    Each chunk resumes after the last (expected_return_date, id) of the
+    previous one, so every query is a bounded range scan of
+    borrowing_overdue_idx.
+    """
+    queryset = annotate_fines(overdue_borrowings(today), as_of=today).order_by(
+        "expected_return_date", "id"
+    )
+    last = None
+    while True:
+        chunk = queryset
+        if last is not None:
+            last_date, last_id = last
+            chunk = chunk.filter(expected_return_date__gte=last_date).exclude(
+                expected_return_date=last_date, id__lte=last_id
+            )
+        rows = list(
+            chunk.values_list(
+                "expected_return_date", "id", "user_id", "fine_amount"
+            )[:chunk_size]
+        )
+        if not rows:
+            return
+        yield [row[1:] for row in rows]
+        last = rows[-1][:2]
+
+
+def assess_fines(rows, as_of):
+    """Create missing fines for ``rows`` and refresh the pending ones."""
+    with transaction.atomic():
+        borrowing_ids = [borrowing_id for borrowing_id, _, _ in rows]
+        if connection.features.has_select_for_update:
+            # Inserting a payment for a borrowing waits on this lock, so no
+            # other fine can appear for these borrowings until commit.
+            list(
+                Borrowing.objects.select_for_update()
+                .filter(pk__in=borrowing_ids)
+                .values_list("pk", flat=True)
+            )
+        fined = set(
+            Payment.objects.filter(
+                borrowing_id__in=borrowing_ids, type=Payment.Type.FINE
+            ).values_list("borrowing_id", flat=True)
+        )
+        fines = [
+            Payment(
+                borrowing_id=borrowing_id,
+                user_id=user_id,
+                money_to_pay=amount,
+                type=Payment.Type.FINE,
+                status=Payment.Status.PENDING,
+            )
+            for borrowing_id, user_id, amount in rows
+            if borrowing_id not in fined
+        ]
+        Payment.objects.bulk_create(fines)
+        if fines and fines[0].pk is None:
+            # No RETURNING support; under the lock these are the new rows.
+            fines = Payment.objects.filter(
+                borrowing_id__in=[fine.borrowing_id for fine in fines],
+                type=Payment.Type.FINE,
+            )
+        record_status_changes(fines)
+        updated = recalculate_fines(fined, as_of) if fined else 0
+    return len(fines), updated
+
+
+def generate_overdue_fines(today=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    today = today or timezone.localdate()
+    processed = created = updated = 0
+    for rows in iter_overdue_chunks(today, chunk_size):
+        processed += len(rows)
+        chunk_created, chunk_updated = assess_fines(rows, today)
+        created += chunk_created
+        updated += chunk_updated
+    return {"processed": processed, "created": created, "updated": updated}
@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payment.fines import DEFAULT_CHUNK_SIZE, generate_overdue_fines
+
+
+class Command(BaseCommand):
+    help = "Create pending fines for overdue borrowings. Safe to re-run."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=datetime.date.fromisoformat,
+            help="Treat this day (YYYY-MM-DD) as today.",
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        result = generate_overdue_fines(options["date"], options["chunk_size"])
+        self.stdout.write(
+            f"Processed {result['processed']} overdue borrowings, "
+            f"created {result['created']} fines, "
+            f"updated {result['updated']}."
+        )
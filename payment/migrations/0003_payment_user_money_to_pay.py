@@ -0,0 +1,45 @@
+# Generated by Django 4.1.5 on 2026-10-18 20:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_fine_users(apps, schema_editor):
+    Payment = apps.get_model("payment", "Payment")
+    Borrowing = apps.get_model("borrowings", "Borrowing")
+    Payment.objects.filter(borrowing__isnull=False).update(
+        user=models.Subquery(
+            Borrowing.objects.filter(pk=models.OuterRef("borrowing_id")).values(
+                "user_id"
+            )
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("payment", "0002_payment_borrowing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="money_to_pay",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="user",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="payments",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(fill_fine_users, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from borrowings.models import Borrowing
+
 
 class Payment(models.Model):
     class Status(models.TextChoices):
@@ -13,3 +16,27 @@ class Payment(models.Model):
 
     status = models.CharField(max_length=2, choices=Status.choices)
     type = models.CharField(max_length=2, choices=Type.choices)
+    borrowing = models.ForeignKey(
+        Borrowing,
+        on_delete=models.CASCADE,
+        related_name="payments",
+        null=True,
+        blank=True,
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="payments",
+        null=True,
+        blank=True,
+    )
+    money_to_pay = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["borrowing"],
+                condition=models.Q(type="FN"),
+                name="unique_fine_per_borrowing",
+            ),
+        ]
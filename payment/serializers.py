@@ -1,9 +1,10 @@
 from rest_framework import serializers
 
+from library.metrics import TimedSerializerMixin
 from payment.models import Payment
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = "__all__"
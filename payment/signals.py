@@ -0,0 +1,19 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from payment.events import record_status_changes
+from payment.models import Payment
+
+
+@receiver(post_init, sender=Payment)
+def remember_status(sender, instance, **kwargs):
+    # __dict__ so that a deferred status is not loaded.
+    instance._saved_status = instance.__dict__.get("status")
+
+
+@receiver(post_save, sender=Payment)
+def record_status_change(sender, instance, created, **kwargs):
+    previous = None if created else instance._saved_status
+    if created or instance.status != previous:
+        record_status_changes([instance], previous)
+    instance._saved_status = instance.status
@@ -0,0 +1,17 @@
+from django.db.models import F
+from django.utils import timezone
+
+from borrowings.models import Borrowing
+from payment.fines import annotate_fines, assess_fines
+from tasks.registry import task
+
+
+@task
+def assess_late_return_fine(borrowing_id):
+    """Create or refresh the fine of a borrowing that was returned late."""
+    late = Borrowing.objects.filter(
+        pk=borrowing_id, actual_return_date__gt=F("expected_return_date")
+    )
+    rows = list(annotate_fines(late).values_list("id", "user_id", "fine_amount"))
+    if rows:
+        assess_fines(rows, timezone.localdate())
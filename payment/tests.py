@@ -1,6 +1,14 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 from rest_framework_simplejwt.tokens import AccessToken
 
+from books.models import Book
+from borrowings.models import Borrowing
+from payment.fines import annotate_fines, generate_overdue_fines, recalculate_fines
 from payment.models import Payment
 from payment.serializers import PaymentSerializer
 from rest_framework.test import APIClient
@@ -123,3 +131,105 @@ class PaymentViewSetTest(TestCase):
         response = self.client.delete(f"/api/payments/{self.payment.id}/")
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Payment.objects.count(), 0)
+
+
+class OverdueFinesTest(TestCase):
+    def setUp(self):
+        self.today = datetime.date(2023, 3, 1)
+        self.user = User.objects.create_user(email='reader@mail.com', password='testpass')
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", cover="HR", inventory=5, daily_fee=1.00,
+        )
+        self.overdue = [
+            self.borrow(expected_return_date=datetime.date(2023, 2, 20)),
+            self.borrow(expected_return_date=datetime.date(2023, 2, 20)),
+            self.borrow(expected_return_date=datetime.date(2023, 2, 28)),
+        ]
+        self.borrow(expected_return_date=self.today)
+        self.borrow(
+            expected_return_date=datetime.date(2023, 2, 1),
+            actual_return_date=datetime.date(2023, 2, 5),
+        )
+
+    def borrow(self, **kwargs):
+        return Borrowing.objects.create(book=self.book, user=self.user, **kwargs)
+
+    def fined_borrowings(self):
+        return sorted(
+            Payment.objects.filter(type=Payment.Type.FINE).values_list("borrowing_id", flat=True)
+        )
+
+    def test_creates_one_pending_fine_per_overdue_borrowing(self):
+        result = generate_overdue_fines(self.today, chunk_size=1)
+        self.assertEqual(result, {"processed": 3, "created": 3, "updated": 0})
+        self.assertEqual(self.fined_borrowings(), [borrowing.id for borrowing in self.overdue])
+        self.assertFalse(
+            Payment.objects.filter(type=Payment.Type.FINE).exclude(status=Payment.Status.PENDING).exists()
+        )
+
+    def test_rerun_is_idempotent(self):
+        generate_overdue_fines(self.today, chunk_size=2)
+        result = generate_overdue_fines(self.today, chunk_size=2)
+        self.assertEqual(result, {"processed": 3, "created": 0, "updated": 3})
+        self.assertEqual(Payment.objects.filter(type=Payment.Type.FINE).count(), 3)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("generate_fines", "--date", "2023-03-01", stdout=out)
+        self.assertIn("created 3 fines, updated 0", out.getvalue())
+
+
+class FineEngineTest(TestCase):
+    def setUp(self):
+        self.today = datetime.date(2023, 3, 1)
+        self.user = User.objects.create_user(email='reader@mail.com', password='testpass')
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", cover="HR", inventory=5, daily_fee=1.99,
+        )
+        self.open_loan = Borrowing.objects.create(
+            book=self.book, user=self.user, expected_return_date=datetime.date(2023, 2, 20),
+        )
+        self.returned_late = Borrowing.objects.create(
+            book=self.book,
+            user=self.user,
+            expected_return_date=datetime.date(2023, 2, 1),
+            actual_return_date=datetime.date(2023, 2, 5),
+        )
+        self.on_time = Borrowing.objects.create(
+            book=self.book, user=self.user, expected_return_date=datetime.date(2023, 3, 10),
+        )
+
+    def test_annotate_fines(self):
+        amounts = dict(
+            annotate_fines(Borrowing.objects.all(), as_of=self.today, multiplier=Decimal("2"))
+            .values_list("id", "fine_amount")
+        )
+        self.assertEqual(amounts, {
+            self.open_loan.id: Decimal("35.82"),
+            self.returned_late.id: Decimal("15.92"),
+            self.on_time.id: Decimal("0.00"),
+        })
+
+    def test_generated_fines_carry_user_and_amount(self):
+        with self.settings(FINE_MULTIPLIER=Decimal("2")):
+            generate_overdue_fines(self.today)
+        fine = Payment.objects.get(borrowing=self.open_loan)
+        self.assertEqual((fine.user, fine.money_to_pay), (self.user, Decimal("35.82")))
+
+    def test_recalculate_pending_fines_in_one_statement(self):
+        pending = Payment.objects.create(
+            borrowing=self.returned_late, user=self.user,
+            type=Payment.Type.FINE, status=Payment.Status.PENDING,
+        )
+        paid = Payment.objects.create(
+            borrowing=self.open_loan, user=self.user, money_to_pay=Decimal("1.00"),
+            type=Payment.Type.FINE, status=Payment.Status.PAID,
+        )
+
+        with self.assertNumQueries(1):
+            recalculate_fines(Borrowing.objects.filter(book=self.book), multiplier=Decimal("3"))
+
+        pending.refresh_from_db()
+        paid.refresh_from_db()
+        self.assertEqual(pending.money_to_pay, Decimal("23.88"))
+        self.assertEqual(paid.money_to_pay, Decimal("1.00"))
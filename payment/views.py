@@ -1,12 +1,27 @@
+from django.db import transaction
 from rest_framework.viewsets import ModelViewSet
 
 from books.permissions import IsAdminOrReadOnly
+from idempotency.mixins import IdempotentCreateMixin
+from library.db_routing import ReplicaRoutingMixin
+from library.values import ValuesReadMixin
 from payment.models import Payment
 from payment.serializers import PaymentSerializer
 
 
-class PaymentViewSet(ModelViewSet):
+class PaymentViewSet(
+    IdempotentCreateMixin, ReplicaRoutingMixin, ValuesReadMixin, ModelViewSet
+):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    idempotency_scope = "payments.create"
 
+    def perform_create(self, serializer):
+        # Outbox events are written by the save signals, in this transaction.
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.worker import (
+    DEFAULT_RETRY_BACKOFF,
+    DEFAULT_VISIBILITY_TIMEOUT,
+    DEFAULT_WORKERS,
+    Worker,
+)
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks on a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+        parser.add_argument(
+            "--visibility-timeout",
+            type=int,
+            default=DEFAULT_VISIBILITY_TIMEOUT,
+            help="Seconds before a claimed task may be claimed again.",
+        )
+        parser.add_argument(
+            "--backoff",
+            type=int,
+            default=DEFAULT_RETRY_BACKOFF,
+            help="Seconds before the first retry, doubled on each failure.",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when no tasks are due instead of polling.",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers must be positive.")
+
+        worker = Worker(
+            workers=options["workers"],
+            visibility_timeout=options["visibility_timeout"],
+            backoff=options["backoff"],
+            poll_interval=options["poll_interval"],
+            log=lambda message: self.stderr.write(message),
+        )
+        try:
+            worker.run(once=options["once"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(
+            f"Ran {worker.succeeded + worker.failed} tasks, "
+            f"{worker.failed} failed."
+        )
@@ -0,0 +1,74 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class TaskQuerySet(models.QuerySet):
+    def due(self, now=None):
+        return self.filter(
+            status=Task.Status.QUEUED, run_after__lte=now or timezone.now()
+        )
+
+    def claim(self, limit, lease):
+        """Lease up to ``limit`` due tasks until ``lease`` and return them.
+
+        Rows are locked with SKIP LOCKED where the database supports it, so
+        workers do not wait on each other. The UPDATE only takes rows that
+        are still due, which keeps claims exclusive on SQLite as well: a
+        worker that lost the race updates nothing.
+        """
+        token = uuid.uuid4().hex
+        now = timezone.now()
+        with transaction.atomic():
+            due = self.due(now).order_by("run_after", "id")
+            if connection.features.has_select_for_update_skip_locked:
+                due = due.select_for_update(skip_locked=True)
+            ids = list(due.values_list("pk", flat=True)[:limit])
+            if not ids:
+                return []
+            self.due(now).filter(pk__in=ids).update(
+                claim=token, run_after=lease, attempts=F("attempts") + 1
+            )
+        return list(self.filter(claim=token))
+
+
+class Task(models.Model):
+    """A queued call of a function registered with ``tasks.registry.task``.
+
+    A running task stays QUEUED with ``run_after`` pushed to the end of its
+    lease, so it runs again if its worker dies. Finished tasks are deleted.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "QD", _("Queued")
+        FAILED = "FL", _("Failed")
+
+    name = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(
+        max_length=2, choices=Status.choices, default=Status.QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField()
+    run_after = models.DateTimeField(default=timezone.now)
+    claim = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["run_after", "id"],
+                condition=models.Q(status="QD"),
+                name="task_due_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
@@ -0,0 +1,66 @@
+from django.db import transaction
+
+from tasks.models import Task
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+_tasks = {}
+
+
+class TaskFunction:
+    def __init__(self, function, name, max_attempts, atomic):
+        self.function = function
+        self.name = name
+        self.max_attempts = max_attempts
+        self.atomic = atomic
+        self.__doc__ = function.__doc__
+
+    def __call__(self, **kwargs):
+        return self.function(**kwargs)
+
+    def enqueue(self, **kwargs):
+        """Queue a call with ``kwargs`` once the current transaction commits.
+
+        ``kwargs`` must be JSON serializable. Nothing is queued if the
+        transaction rolls back.
+        """
+        transaction.on_commit(
+            lambda: Task.objects.create(
+                name=self.name, kwargs=kwargs, max_attempts=self.max_attempts
+            )
+        )
+
+
+def task(
+    function=None, *, name=None, max_attempts=DEFAULT_MAX_ATTEMPTS, atomic=True
+):
+    """Register ``function`` so it can be queued with ``function.enqueue()``.
+
+    Tasks are found by name, ``<module>.<function>`` by default, in the
+    ``tasks`` module of each installed app.
+
+    An atomic task runs in one transaction with the deletion of its row, so
+    it takes effect exactly once. That transaction holds the database write
+    lock for the whole run on the library.sqlite backend. Tasks that wait on
+    external I/O, such as sending notifications, should pass
+    ``atomic=False``. They then run outside a transaction and, if their
+    lease runs out, may run more than once.
+    """
+
+    def register(function):
+        registered = TaskFunction(
+            function,
+            name or f"{function.__module__}.{function.__name__}",
+            max_attempts,
+            atomic,
+        )
+        _tasks[registered.name] = registered
+        return registered
+
+    if function is None:
+        return register
+    return register(function)
+
+
+def get_task(name):
+    return _tasks.get(name)
@@ -0,0 +1,184 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from books.models import Book
+from tasks.models import Task
+from tasks.registry import task
+from tasks.worker import execute, retry_delay
+
+calls = []
+
+
+@task(name="tests.record", max_attempts=2)
+def record(value):
+    calls.append(value)
+    Book.objects.create(
+        title=value, author="Task", cover="HR", inventory=1, daily_fee=1
+    )
+
+
+@task(name="tests.fail", max_attempts=2)
+def fail():
+    Book.objects.create(
+        title="Fail", author="Task", cover="HR", inventory=1, daily_fee=1
+    )
+    raise RuntimeError("boom")
+
+
+@task(name="tests.outside_transaction", atomic=False)
+def outside_transaction(value):
+    calls.append(connection.in_atomic_block)
+    Book.objects.create(
+        title=value, author="Task", cover="HR", inventory=1, daily_fee=1
+    )
+
+
+def lease(seconds=300):
+    return timezone.now() + datetime.timedelta(seconds=seconds)
+
+
+class EnqueueTest(TestCase):
+    def test_queued_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record.enqueue(value="a")
+            self.assertFalse(Task.objects.exists())
+
+        queued = Task.objects.get()
+        self.assertEqual(queued.name, "tests.record")
+        self.assertEqual(queued.kwargs, {"value": "a"})
+        self.assertEqual(queued.max_attempts, 2)
+
+    def test_not_queued_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    record.enqueue(value="a")
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Task.objects.exists())
+
+
+class ClaimAndExecuteTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_claims_are_exclusive_until_the_lease_expires(self):
+        Task.objects.create(name="tests.record", kwargs={"value": "a"}, max_attempts=2)
+        Task.objects.create(
+            name="tests.record",
+            kwargs={"value": "later"},
+            max_attempts=2,
+            run_after=lease(),
+        )
+
+        claimed = Task.objects.claim(10, lease())
+        self.assertEqual([claimed.kwargs for claimed in claimed], [{"value": "a"}])
+        self.assertEqual(claimed[0].attempts, 1)
+        self.assertEqual(Task.objects.claim(10, lease()), [])
+
+        Task.objects.filter(pk=claimed[0].pk).update(run_after=timezone.now())
+        reclaimed = Task.objects.claim(10, lease())
+        self.assertEqual([task.pk for task in reclaimed], [claimed[0].pk])
+        self.assertEqual(reclaimed[0].attempts, 2)
+
+    def test_success_deletes_the_task(self):
+        Task.objects.create(name="tests.record", kwargs={"value": "a"}, max_attempts=2)
+        [claimed] = Task.objects.claim(1, lease())
+
+        self.assertTrue(execute(claimed))
+        self.assertEqual(calls, ["a"])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failure_is_retried_with_backoff_then_marked_failed(self):
+        Task.objects.create(name="tests.fail", max_attempts=2)
+        [claimed] = Task.objects.claim(1, lease())
+        before = timezone.now()
+
+        self.assertFalse(execute(claimed, backoff=30))
+        queued = Task.objects.get()
+        self.assertEqual(queued.status, Task.Status.QUEUED)
+        self.assertGreaterEqual(
+            queued.run_after, before + datetime.timedelta(seconds=30)
+        )
+        self.assertIn("RuntimeError: boom", queued.last_error)
+        self.assertFalse(Book.objects.exists())
+
+        Task.objects.update(run_after=timezone.now())
+        [claimed] = Task.objects.claim(1, lease())
+        self.assertFalse(execute(claimed))
+        self.assertEqual(Task.objects.get().status, Task.Status.FAILED)
+        self.assertEqual(Task.objects.claim(1, lease()), [])
+
+    def test_work_of_a_task_that_lost_its_lease_is_rolled_back(self):
+        Task.objects.create(name="tests.record", kwargs={"value": "a"}, max_attempts=2)
+        [claimed] = Task.objects.claim(1, lease())
+        Task.objects.update(claim="someone-else")
+
+        self.assertFalse(execute(claimed))
+        self.assertFalse(Book.objects.exists())
+        self.assertTrue(Task.objects.exists())
+
+    def test_unknown_task_fails_at_once(self):
+        Task.objects.create(name="tests.missing", max_attempts=5)
+        [claimed] = Task.objects.claim(1, lease())
+
+        self.assertFalse(execute(claimed))
+        failed = Task.objects.get()
+        self.assertEqual(failed.status, Task.Status.FAILED)
+        self.assertIn("Unknown task 'tests.missing'", failed.last_error)
+
+    def test_retry_delay_doubles_up_to_an_hour(self):
+        self.assertEqual(
+            [retry_delay(attempts, 10) for attempts in (1, 2, 3)], [10, 20, 40]
+        )
+        self.assertEqual(retry_delay(20, 10), 3600)
+
+
+class RunTasksCommandTest(TransactionTestCase):
+    def test_runs_due_tasks_on_the_pool(self):
+        for value in "abcde":
+            Task.objects.create(
+                name="tests.record", kwargs={"value": value}, max_attempts=2
+            )
+        Task.objects.create(name="tests.fail", max_attempts=1)
+
+        out = StringIO()
+        call_command("run_tasks", "--once", "--workers", "1", stdout=out)
+        self.assertIn("Ran 6 tasks, 1 failed.", out.getvalue())
+        self.assertEqual(
+            sorted(Book.objects.values_list("title", flat=True)), list("abcde")
+        )
+        self.assertEqual(Task.objects.get().status, Task.Status.FAILED)
+
+
+class TaskTransactionTest(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_non_atomic_task_runs_outside_a_transaction(self):
+        Task.objects.create(
+            name="tests.outside_transaction", kwargs={"value": "a"}, max_attempts=1
+        )
+        [claimed] = Task.objects.claim(1, lease())
+
+        self.assertTrue(execute(claimed))
+        self.assertEqual(calls, [False])
+        self.assertFalse(Task.objects.exists())
+
+    def test_non_atomic_task_keeps_its_work_when_the_lease_is_lost(self):
+        Task.objects.create(
+            name="tests.outside_transaction", kwargs={"value": "a"}, max_attempts=1
+        )
+        [claimed] = Task.objects.claim(1, lease())
+        Task.objects.update(claim="someone-else")
+
+        self.assertFalse(execute(claimed))
+        self.assertTrue(Book.objects.filter(title="a").exists())
+        self.assertTrue(Task.objects.exists())
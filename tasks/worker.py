@@ -0,0 +1,128 @@
+import time
+import traceback
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from tasks.models import Task
+from tasks.registry import get_task
+
+DEFAULT_WORKERS = 4
+DEFAULT_VISIBILITY_TIMEOUT = 300
+DEFAULT_RETRY_BACKOFF = 10
+MAX_RETRY_BACKOFF = 3600
+MAX_ERROR_LENGTH = 4000
+
+
+class LeaseLost(Exception):
+    """Another worker claimed the task after its lease ran out."""
+
+
+def retry_delay(attempts, backoff=DEFAULT_RETRY_BACKOFF):
+    """Seconds before another attempt: ``backoff`` doubled per failed attempt."""
+    return min(backoff * 2 ** (attempts - 1), MAX_RETRY_BACKOFF)
+
+
+def execute(task, backoff=DEFAULT_RETRY_BACKOFF):
+    """Run a claimed task and return whether it succeeded.
+
+    For atomic tasks the task's writes and the deletion of its row commit
+    together, so work of a task whose lease was taken over meanwhile is
+    rolled back. Other tasks run outside a transaction; their row is only
+    deleted if they still hold the lease when they finish. A failed
+    task is queued again after ``retry_delay()`` until it runs out of
+    attempts, then marked FAILED with its traceback.
+    """
+    registered = get_task(task.name)
+    try:
+        if registered is None:
+            raise LookupError(f"Unknown task {task.name!r}.")
+        with transaction.atomic() if registered.atomic else nullcontext():
+            registered(**task.kwargs)
+            if not Task.objects.filter(pk=task.pk, claim=task.claim).delete()[0]:
+                raise LeaseLost()
+        return True
+    except LeaseLost:
+        return False
+    except Exception:
+        error = traceback.format_exc()[-MAX_ERROR_LENGTH:]
+
+    retry = registered is not None and task.attempts < task.max_attempts
+    Task.objects.filter(pk=task.pk, claim=task.claim).update(
+        status=Task.Status.QUEUED if retry else Task.Status.FAILED,
+        run_after=timezone.now()
+        + timedelta(seconds=retry_delay(task.attempts, backoff)),
+        claim="",
+        last_error=error,
+    )
+    return False
+
+
+class Worker:
+    """Claim due tasks and run them on a pool of ``workers`` threads.
+
+    Tasks are leased for ``visibility_timeout`` seconds; one still running
+    after that may be claimed and run again by another worker.
+    """
+
+    def __init__(
+        self,
+        workers=DEFAULT_WORKERS,
+        visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT,
+        backoff=DEFAULT_RETRY_BACKOFF,
+        poll_interval=1.0,
+        log=print,
+    ):
+        self.workers = workers
+        self.visibility_timeout = visibility_timeout
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.log = log
+        self.succeeded = 0
+        self.failed = 0
+
+    def claim(self, limit):
+        lease = timezone.now() + timedelta(seconds=self.visibility_timeout)
+        try:
+            return Task.objects.claim(limit, lease)
+        except DatabaseError as error:
+            self.log(f"Claiming tasks failed: {error}")
+            return []
+
+    def execute(self, task):
+        close_old_connections()
+        try:
+            return execute(task, self.backoff)
+        except DatabaseError as error:
+            # The lease runs out and the task is retried.
+            self.log(f"Task {task.pk} failed to record its result: {error}")
+            return False
+        finally:
+            close_old_connections()
+
+    def run(self, once=False):
+        """Process tasks until interrupted, or with ``once`` until none are due."""
+        running = set()
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="task") as pool:
+            while True:
+                free = self.workers - len(running)
+                for task in self.claim(free) if free else []:
+                    running.add(pool.submit(self.execute, task))
+
+                if not running:
+                    if once:
+                        return
+                    time.sleep(self.poll_interval)
+                    continue
+
+                done, running = wait(
+                    running, timeout=self.poll_interval, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.result():
+                        self.succeeded += 1
+                    else:
+                        self.failed += 1
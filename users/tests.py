@@ -1,3 +1,96 @@
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.authentication import (
+    CachedJWTAuthentication,
+    ClaimsUser,
+    StatelessJWTAuthentication,
+)
+from users.models import User
+
+
+class TokenClaimsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_superuser(email="admin@mail.com", password="adminpass")
+
+    def test_issued_tokens_carry_email_and_staff_claims(self):
+        response = self.client.post(
+            "/api/user/token/", {"email": "admin@mail.com", "password": "adminpass"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = AccessToken(response.data["access"])
+        self.assertEqual(token["email"], "admin@mail.com")
+        self.assertTrue(token["is_staff"])
+
+
+class StatelessJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email="reader@mail.com", password="testpass")
+        self.factory = APIRequestFactory()
+
+    def authenticate(self, authentication, token):
+        request = self.factory.get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        user, _ = authentication.authenticate(request)
+        return user
+
+    def claims_token(self):
+        token = AccessToken.for_user(self.user)
+        token["email"] = self.user.email
+        token["is_staff"] = self.user.is_staff
+        return token
+
+    def test_user_is_built_from_claims(self):
+        with self.assertNumQueries(0):
+            user = self.authenticate(StatelessJWTAuthentication(), self.claims_token())
+            self.assertEqual((user.id, user.email, user.is_staff), (self.user.id, "reader@mail.com", False))
+        self.assertIsInstance(user, ClaimsUser)
+
+    def test_missing_claims_fall_back_to_the_database(self):
+        user = self.authenticate(StatelessJWTAuthentication(), AccessToken.for_user(self.user))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, "reader@mail.com")
+            self.assertEqual(user.date_joined, self.user.date_joined)
+
+    def test_cached_authentication_reuses_the_user(self):
+        token = AccessToken.for_user(self.user)
+        cache.clear()
+        with self.assertNumQueries(1):
+            first = self.authenticate(CachedJWTAuthentication(), token)
+            second = self.authenticate(CachedJWTAuthentication(), token)
+        self.assertEqual(first, second)
+        self.assertIsInstance(second, User)
+
+    def test_saving_a_user_drops_its_cached_copy(self):
+        token = AccessToken.for_user(self.user)
+        cache.clear()
+        self.assertFalse(self.authenticate(CachedJWTAuthentication(), token).is_staff)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(self.authenticate(CachedJWTAuthentication(), token).is_staff)
+
+    def test_api_request_in_stateless_mode(self):
+        # Views bind their authentication classes at import time.
+        client = APIClient()
+        with mock.patch.object(
+            APIView, "authentication_classes", (StatelessJWTAuthentication,)
+        ):
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.claims_token()}")
+            response = client.get("/api/borrowings/")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = client.post("/api/books/", {})
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
-# Create your tests here.
+            # The staff claim is trusted without looking at the row.
+            token = self.claims_token()
+            token["is_staff"] = True
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            response = client.post("/api/books/", {})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -2,8 +2,13 @@ from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from rest_framework_simplejwt.views import TokenObtainPairView
 
-from users.serializers import UserSerializer, AuthTokenSerializer
+from users.serializers import (
+    UserSerializer,
+    AuthTokenSerializer,
+    ClaimsTokenObtainPairSerializer,
+)
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -15,6 +20,11 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
 
 
+class CreateTokenPairView(TokenObtainPairView):
+    serializer_class = ClaimsTokenObtainPairSerializer
+    throttle_scope = "token"
+
+
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = (IsAuthenticated,)